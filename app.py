@@ -1,20 +1,43 @@
 import os
 import secrets
+from urllib.parse import urlparse
 from flask import Flask, render_template, request, redirect, url_for, session, abort, send_file
-from db import init_db, connect
-from tmdb import TMDb
+import catalog
+import facets
+from compression import init_compression
+from db import init_db, connect, connect_catalog
+from profiling import init_profiling, record_poster_cache
+from tmdb import TMDb, now_iso
+from warming import AccessLog
 from store import (
-    CACHE_DIR,
+    browse_movies,
+    director_filmography,
+    director_stats,
+    download_poster,
+    facet_counts,
     fetch_movies_for_ids,
+    list_directors,
+    poster_cache_path,
+    poster_path_for,
+    similar_for,
 )
 
 from dotenv import load_dotenv
 load_dotenv()
 
 APP_SECRET = os.getenv("APP_SECRET_KEY") or secrets.token_hex(16)
+CATALOG_SNAPSHOT = os.getenv("CATALOG_SNAPSHOT", "false").lower() in ("true", "1", "yes")
+
+# Pages rendered by static_export.py can't carry a per-session token; their forms post this instead.
+STATIC_CSRF_TOKEN = "static-export"
 
 app = Flask(__name__)
 app.secret_key = APP_SECRET
+init_profiling(app)
+init_compression(app)
+
+# Browse pages, shares and poster sizes actually requested, for the poster warmer (warming.py).
+ACCESS_LOG = AccessLog()
 
 
 def basket_ids() -> set[int]:
@@ -24,18 +47,48 @@ def basket_ids() -> set[int]:
 def set_basket(ids: set[int]) -> None:
     session["basket"] = sorted(ids)
 
+def record_access(kind: str, key: str) -> None:
+    # The static export renders every page once; that is not traffic.
+    if not app.config.get("STATIC_EXPORT"):
+        ACCESS_LOG.record(kind, key)
+
 def ensure_csrf():
     if "csrf" not in session:
         session["csrf"] = secrets.token_urlsafe(16)
 
+def same_origin() -> bool:
+    source = request.headers.get("Origin") or request.headers.get("Referer") or ""
+    return urlparse(source).netloc == request.host
+
+def mask_csrf(token: str) -> str:
+    # A fresh random pad per response, so a compressed page never repeats the secret (BREACH).
+    raw = token.encode()
+    pad = secrets.token_bytes(len(raw))
+    return (pad + bytes(a ^ b for a, b in zip(raw, pad))).hex()
+
+def unmask_csrf(masked: str) -> str:
+    try:
+        data = bytes.fromhex(masked)
+    except ValueError:
+        return ""
+    half = len(data) // 2
+    return bytes(a ^ b for a, b in zip(data[:half], data[half:])).decode("utf-8", "replace")
+
 def check_csrf():
     token = request.form.get("csrf", "")
-    if not token or token != session.get("csrf"):
-        abort(400, "Bad CSRF token")
+    expected = session.get("csrf")
+    if token and expected and secrets.compare_digest(unmask_csrf(token), expected):
+        return
+    # The static token is public, so it only counts on a same-origin post.
+    if token == STATIC_CSRF_TOKEN and same_origin():
+        return
+    abort(400, "Bad CSRF token")
 
 @app.context_processor
 def inject_globals():
-    ensure_csrf()
+    static_export = app.config.get("STATIC_EXPORT", False)
+    if not static_export:
+        ensure_csrf()
 
     # Search link configuration
     search_links = []
@@ -50,8 +103,8 @@ def inject_globals():
         search_links.append({"label": link2_label, "url_template": link2_url})
 
     return {
-        "basket_count": len(basket_ids()),
-        "csrf_token": session.get("csrf", ""),
+        "basket_count": None if static_export else len(basket_ids()),
+        "csrf_token": STATIC_CSRF_TOKEN if static_export else mask_csrf(session.get("csrf", "")),
         "search_links": search_links,
     }
 
@@ -69,74 +122,61 @@ def browse():
     sort = request.args.get("sort") or "popularity"
     year_min = (request.args.get("year_min") or "").strip()
     year_max = (request.args.get("year_max") or "").strip()
-    page = int(request.args.get("page") or 1)
+    page = max(1, request.args.get("page", 1, type=int))
     show_plots = request.args.get("plots") == "1"
     PAGE_SIZE = 20
 
-    where = ["1=1"]
-    params = []
-
-    if q:
-        where.append("m.title LIKE ?")
-        params.append(f"%{q}%")
-
-    if year_min.isdigit():
-        where.append("m.year >= ?")
-        params.append(int(year_min))
-    if year_max.isdigit():
-        where.append("m.year <= ?")
-        params.append(int(year_max))
-
-    where.append("""
-      EXISTS (
-        SELECT 1
-        FROM credits_director cd
-        JOIN people p ON p.tmdb_person_id = cd.tmdb_person_id
-        WHERE cd.tmdb_id = m.tmdb_id
-          AND p.gender = 1
-      )
-    """)
-
-    order = {
-        "popularity": "m.popularity DESC NULLS LAST",
-        "rating": "m.vote_avg DESC NULLS LAST",
-        "votes": "m.vote_count DESC NULLS LAST",
-        "year": "m.year DESC NULLS LAST",
-    }.get(sort, "m.popularity DESC NULLS LAST")
-
     limit = PAGE_SIZE + 1
     offset = (page - 1) * PAGE_SIZE
-    with connect() as conn:
-        total_count = conn.execute(
-            f"""
-            SELECT COUNT(*)
-            FROM movies m
-            WHERE {" AND ".join(where)}
-            """,
-            params,
-        ).fetchone()[0]
-        movies = conn.execute(
-            f"""
-            SELECT m.*
-            FROM movies m
-            WHERE {" AND ".join(where)}
-            ORDER BY {order}
-            LIMIT ? OFFSET ?
-            """,
-            params + [limit, offset],
-        ).fetchall()
+
+    selected = facets.parse(request.args)
+    filters = dict(
+        q=q,
+        year_min=int(year_min) if year_min.isdigit() else None,
+        year_max=int(year_max) if year_max.isdigit() else None,
+        facets=selected,
+    )
+
+    # Same query either way; the snapshot answers from RAM instead of SQLite.
+    if CATALOG_SNAPSHOT:
+        snapshot = catalog.current()
+        total_count, movies = snapshot.browse(sort=sort, offset=offset, limit=limit, **filters)
+        counts, director_names = snapshot.facet_counts(**filters), snapshot.director_names
+    else:
+        total_count, movies = browse_movies(sort=sort, offset=offset, limit=limit, **filters)
+        counts, director_names = facet_counts(**filters)
+    facet_groups = facets.options(counts, selected, director_names)
 
     has_next = len(movies) > PAGE_SIZE
     movies = movies[:PAGE_SIZE]
+    # Only real pages: one past the end would make the warmer query an empty OFFSET.
+    if movies and sort in catalog.SORT_COLUMNS and not (q or year_min or year_max or selected):
+        record_access("browse", f"{sort}:{page}")
 
     toggle_plots_url = url_for(
         "browse",
         q=q, sort=sort,
         year_min=year_min, year_max=year_max,
         page=page,
-        plots="0" if show_plots else "1"
+        plots="0" if show_plots else "1",
+        **selected
     )
 
+    def facet_url(name, key):
+        # Clicking the selected option clears that facet; any change goes back to page 1.
+        params = dict(selected)
+        if params.get(name) == key:
+            del params[name]
+        else:
+            params[name] = key
+        return url_for(
+            "browse",
+            q=q, sort=sort,
+            year_min=year_min, year_max=year_max,
+            plots="1" if show_plots else "0",
+            **params
+        )
+
     return render_template(
         "browse.html",
         title="Browse",
@@ -150,10 +190,14 @@ def browse():
         show_plots=show_plots,
         toggle_plots_url=toggle_plots_url,
         total_movie_count=total_count,
+        facet_groups=facet_groups,
+        selected_facets=selected,
+        facet_url=facet_url,
         page_url=page_url_builder(
             q=q, sort=sort,
             year_min=year_min, year_max=year_max,
-            plots="1" if show_plots else "0"
+            plots="1" if show_plots else "0",
+            **selected
         ),
     )
 
@@ -272,6 +316,7 @@ def share_view(token: str):
 
     ids = [int(r["tmdb_id"]) for r in items]
     movies = fetch_movies_for_ids(ids)
+    record_access("share", token)
     show_plots = request.args.get("plots") == "1"
     toggle_plots_url = url_for("share_view", token=token, plots="0" if show_plots else "1")
     return render_template(
@@ -300,7 +345,7 @@ def share_fork(token: str):
 
 @app.get("/movie/<int:tmdb_id>")
 def movie(tmdb_id: int):
-    with connect() as conn:
+    with connect_catalog() as conn:
         m = conn.execute("SELECT * FROM movies WHERE tmdb_id=?", (tmdb_id,)).fetchone()
         directors = conn.execute(
             """
@@ -318,32 +363,59 @@ def movie(tmdb_id: int):
 
     movie_obj = dict(m)
     movie_obj["tmdb_id"] = tmdb_id
-    return render_template("movie.html", title=movie_obj["title"], movie=movie_obj, directors=directors)
+    return render_template(
+        "movie.html",
+        title=movie_obj["title"],
+        movie=movie_obj,
+        directors=directors,
+        similar=similar_for(tmdb_id),
+    )
+
+@app.get("/director/<int:person_id>")
+def director(person_id: int):
+    stats = director_stats(person_id)
+    if not stats:
+        abort(404)
+
+    movies = director_filmography(person_id)
+    return render_template("director.html", title=stats["name"], director=stats, movies=movies)
+
+@app.get("/directors")
+def directors():
+    sort = "rating" if request.args.get("sort") == "rating" else "films"
+    page = max(1, request.args.get("page", 1, type=int))
+    PAGE_SIZE = 50
+
+    total, rows = list_directors(sort=sort, offset=(page - 1) * PAGE_SIZE, limit=PAGE_SIZE)
+    return render_template(
+        "directors.html",
+        title="Directors",
+        directors=rows,
+        sort=sort,
+        page=page,
+        has_next=page * PAGE_SIZE < total,
+        total=total,
+        page_url=lambda p: url_for("directors", sort=sort, page=p),
+    )
 
 @app.get("/img/poster/<size>/<int:tmdb_id>.jpg")
 def poster(size: str, tmdb_id: int):
     if size not in {"w185", "w342", "w500", "w780"}:
         size = "w342"
+    record_access("poster_size", size)
 
-    with connect() as conn:
-        row = conn.execute("SELECT poster_path FROM movies WHERE tmdb_id=?", (tmdb_id,)).fetchone()
-    if not row or not row["poster_path"]:
+    poster_path = poster_path_for(tmdb_id, published=True)
+    if not poster_path:
         abort(404)
 
-    poster_path = row["poster_path"]
-    cache_path = CACHE_DIR / f"{tmdb_id}_{size}.jpg"
+    cache_path = poster_cache_path(tmdb_id, size)
 
     if cache_path.exists():
+        record_poster_cache(hit=True)
         return send_file(cache_path, mimetype="image/jpeg")
 
-    import requests
-    url = TMDb.poster_url(poster_path, size=size)
-    r = requests.get(url, stream=True, timeout=20)
-    r.raise_for_status()
-    with open(cache_path, "wb") as f:
-        for chunk in r.iter_content(chunk_size=1024 * 64):
-            if chunk:
-                f.write(chunk)
+    record_poster_cache(hit=False)
+    download_poster(TMDb.poster_url(poster_path, size=size), cache_path)
 
     return send_file(cache_path, mimetype="image/jpeg")
 
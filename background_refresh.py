@@ -1,9 +1,10 @@
 import argparse
 import time
 
-from db import init_db
+from db import init_db, publish_snapshot, published_path
 from tmdb import TMDb
 from store import (
+    bump_catalog_generation,
     upsert_movie_from_tmdb_payload,
     hydrate_movie_details,
     hydrate_directors,
@@ -65,6 +66,10 @@ def main():
 
         time.sleep(args.sleep)
 
+    if women_count:
+        bump_catalog_generation()
+        if published_path() is not None:
+            print(f"Published {publish_snapshot()}")
     print(f"Scanned {scanned} movies. Hydrated {women_count} women-directed movies.")
 
 
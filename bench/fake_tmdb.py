@@ -0,0 +1,75 @@
+"""Local stand-in for the TMDb API and image CDN, for worker throughput benchmarks.
+
+Every id gets one director; odd ids are directed by a woman. Responses are
+delayed by a fixed latency to approximate a real round trip.
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+POSTER_BYTES = b"\xff\xd8" + b"\0" * 30_000
+
+_CREDITS = re.compile(r"^/3/movie/(\d+)/credits$")
+_DETAILS = re.compile(r"^/3/movie/(\d+)$")
+_POSTER = re.compile(r"^/t/p/\w+/.+$")
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        path = self.path.split("?", 1)[0]
+
+        m = _CREDITS.match(path)
+        if m:
+            mid = int(m.group(1))
+            return self._json({
+                "id": mid,
+                "crew": [{"id": 10_000_000 + mid, "job": "Director", "name": f"Director {mid}", "gender": 1 if mid % 2 else 2}],
+            })
+
+        m = _DETAILS.match(path)
+        if m:
+            mid = int(m.group(1))
+            return self._json({
+                "id": mid,
+                "title": f"Movie {mid}",
+                "release_date": f"{1950 + mid % 75}-01-01",
+                "runtime": 90 + mid % 60,
+                "overview": "A synthetic movie.",
+                "poster_path": f"/{mid:x}.jpg",
+                "vote_average": round(5 + (mid % 40) / 10, 1),
+                "vote_count": mid % 5000,
+                "popularity": (mid % 1000) / 10,
+            })
+
+        if _POSTER.match(path):
+            return self._send(200, "image/jpeg", POSTER_BYTES)
+
+        self._send(404, "application/json", b"{}")
+
+    def _json(self, payload: dict):
+        self._send(200, "application/json", json.dumps(payload).encode("utf-8"))
+
+    def _send(self, status: int, content_type: str, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start(latency: float = 0.0, port: int = 0) -> ThreadingHTTPServer:
+    """Serve in a daemon thread; the bound port is server.server_address[1]."""
+    handler = type("FakeTMDbHandler", (Handler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
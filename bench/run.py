@@ -0,0 +1,236 @@
+"""Benchmark harness: python -m bench.run --movies 100000
+
+Generates (or reuses) a synthetic catalog, runs every case against a scratch
+copy of it and reports p50/p95 in milliseconds. --save writes the results as
+JSON; --baseline compares against a saved run and flags regressions.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from bench import fake_tmdb
+from bench.synth import generate
+
+SORTS = ("popularity", "rating", "votes", "year")
+FILTERS = {
+    "all": {},
+    "years": {"year_min": "1990", "year_max": "2010"},
+    "title": {"q": "night"},
+    "facets": {"decade": "2000", "runtime": "feature", "rating": "6"},
+}
+PAGES = (1, 10, 100)
+
+
+def percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def timed(fn, repeat: int) -> dict:
+    fn()  # warm up caches and the connection path once
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        "n": repeat,
+        "p50": percentile(samples, 0.5),
+        "p95": percentile(samples, 0.95),
+        "mean": statistics.fmean(samples),
+    }
+
+
+def bench_app(results: dict, repeat: int, movies: int, db_path: Path):
+    from app import app
+    from store import fetch_movies_for_ids
+
+    client = app.test_client()
+    rng = random.Random(7)
+
+    for sort in SORTS:
+        for fname, params in FILTERS.items():
+            for page in PAGES:
+                query = dict(params, sort=sort, page=str(page))
+
+                def run(query=query):
+                    r = client.get("/", query_string=query)
+                    assert r.status_code == 200, r.status_code
+
+                results[f"browse sort={sort} filter={fname} page={page}"] = timed(run, repeat)
+
+    for encoding in ("identity", "gzip"):
+        def compressed(encoding=encoding):
+            # Same page every time, so gzip runs hit the compressed-body cache after the warm-up.
+            r = client.get("/", query_string={"plots": "1"}, headers={"Accept-Encoding": encoding})
+            assert r.status_code == 200, r.status_code
+
+        results[f"browse plots=1 encoding={encoding}"] = timed(compressed, repeat)
+
+    for n in (20, 500):
+        ids = [rng.randint(1, movies) for _ in range(n)]
+        results[f"fetch_movies_for_ids n={n}"] = timed(lambda ids=ids: fetch_movies_for_ids(ids), repeat)
+
+    with sqlite3.connect(db_path) as conn:
+        tokens = [r[0] for r in conn.execute("SELECT token FROM shared_sets ORDER BY token LIMIT 50")]
+    if tokens:
+        def share():
+            r = client.get(f"/s/{rng.choice(tokens)}")
+            assert r.status_code == 200, r.status_code
+
+        results["share_view"] = timed(share, repeat)
+
+    for sort in ("films", "rating"):
+        def directors(sort=sort):
+            r = client.get("/directors", query_string={"sort": sort})
+            assert r.status_code == 200, r.status_code
+
+        results[f"directors sort={sort}"] = timed(directors, repeat)
+
+
+def bench_enqueue(results: dict, repeat: int, movies: int):
+    from tmdb_ingest import enqueue_ids
+
+    rng = random.Random(11)
+    state = {"next_new": movies + 1}
+
+    def run():
+        # Half the batch is already known (has director credits), half is new.
+        known = [rng.randint(1, movies) for _ in range(500)]
+        new = list(range(state["next_new"], state["next_new"] + 500))
+        state["next_new"] += 500
+        enqueue_ids(known + new)
+
+    results["enqueue_ids n=1000"] = timed(run, repeat)
+
+
+def bench_worker(results: dict, items: int, movies: int, concurrency: int):
+    import store
+    from tmdb import TMDb
+    from tmdb_ingest import RateLimiter, WorkerStats, enqueue_ids, run_worker
+
+    for n in sorted({1, concurrency}):
+        first = movies + 10_000_000 + n * items
+        enqueue_ids(list(range(first, first + items)))
+        started = time.perf_counter()
+        run_worker(
+            TMDb(),
+            rate=RateLimiter(0),
+            concurrency=n,
+            poster_sizes=["w342"],
+            poster_sleep=0,
+            max_items=items,
+            include_failed=False,
+            max_attempts=1,
+            stats=WorkerStats(interval=0),
+        )
+        elapsed = time.perf_counter() - started
+        results[f"worker concurrency={n}"] = {"n": items, "items_per_sec": items / elapsed}
+        shutil.rmtree(store.CACHE_DIR, ignore_errors=True)
+        store.CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> int:
+    regressions = 0
+    print(f"\n{'case':<52} {'p50':>9} {'p95':>9} {'base p95':>9} {'delta':>8}")
+    for case, r in results.items():
+        b = baseline.get(case)
+        if "items_per_sec" in r:
+            line = f"{case:<52} {r['items_per_sec']:>8.1f}/s"
+            if b and "items_per_sec" in b:
+                delta = (r["items_per_sec"] - b["items_per_sec"]) / b["items_per_sec"]
+                flag = "  REGRESSION" if delta < -tolerance else ""
+                line += f" {'':>9} {b['items_per_sec']:>8.1f}/s {delta:>+7.0%}{flag}"
+                regressions += bool(flag)
+            print(line)
+            continue
+        line = f"{case:<52} {r['p50']:>9.2f} {r['p95']:>9.2f}"
+        if b and "p95" in b:
+            delta = (r["p95"] - b["p95"]) / b["p95"] if b["p95"] else 0.0
+            flag = "  REGRESSION" if delta > tolerance else ""
+            line += f" {b['p95']:>9.2f} {delta:>+8.0%}{flag}"
+            regressions += bool(flag)
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark browse, share, queue and worker paths.")
+    parser.add_argument("--movies", type=int, default=10_000, help="Synthetic catalog size (10k to 2M)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=20, help="Timed repetitions per case")
+    parser.add_argument("--worker-items", type=int, default=200, help="Queue items per worker run (0 = skip)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Async worker concurrency to compare with 1")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Fake TMDb response latency")
+    parser.add_argument("--regenerate", action="store_true", help="Rebuild the synthetic catalog")
+    parser.add_argument("--save", default=None, help="Write results JSON here (e.g. bench/results/baseline.json)")
+    parser.add_argument("--baseline", default=None, help="Compare against a saved results JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before flagging (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    catalog = Path(f"bench/data/catalog-{args.movies}-{args.seed}.sqlite3")
+    if args.regenerate or not catalog.exists():
+        generate(catalog, args.movies, seed=args.seed)
+
+    server = fake_tmdb.start(latency=args.latency_ms / 1000)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["TMDB_API_BASE"] = f"{base}/3"
+    os.environ["TMDB_IMG_BASE"] = f"{base}/t/p"
+    os.environ.setdefault("TMDB_API_KEY", "bench")
+
+    import db
+    import store
+
+    scratch = Path(tempfile.mkdtemp(prefix="moviebench-"))
+    try:
+        db.DB_PATH = scratch / "movies.sqlite3"
+        shutil.copy(catalog, db.DB_PATH)
+        db.init_db()  # apply schema.sql indexes added since the catalog was generated
+        store.rebuild_director_stats()
+        store.bump_catalog_generation()  # builds facet_cube
+        store.CACHE_DIR = scratch / "posters"
+        store.CACHE_DIR.mkdir()
+
+        results: dict = {}
+        bench_app(results, args.repeat, args.movies, db.DB_PATH)
+        bench_enqueue(results, args.repeat, args.movies)
+        if args.worker_items > 0:
+            bench_worker(results, args.worker_items, args.movies, args.concurrency)
+    finally:
+        server.shutdown()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    baseline = {}
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))["results"]
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.save:
+        out = Path(args.save)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        meta = {
+            "movies": args.movies,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }
+        out.write_text(json.dumps({"meta": meta, "results": results}, indent=2), encoding="utf-8")
+        print(f"Saved {out}")
+
+    if regressions:
+        raise SystemExit(f"{regressions} case(s) regressed by more than {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Synthetic catalog generator for benchmarks.
+
+Fills movies, people, credits_director, shared_sets and shared_set_items with
+deterministic pseudo-random data shaped roughly like the real catalog.
+"""
+import argparse
+import random
+import sqlite3
+import time
+from pathlib import Path
+
+WORDS = (
+    "night river house girl summer city love last secret little road dark blue "
+    "woman home water story war heart light sister mother garden glass winter "
+    "island wild silent lost fire moon dream song stranger letter empire ghost "
+    "journey portrait daughter kingdom edge storm shadow promise return"
+).split()
+
+FEMALE_SHARE = 0.10
+MULTI_DIRECTOR_SHARE = 0.08
+NOW = "2026-01-01T00:00:00Z"
+
+
+def _title(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))).title()
+
+
+def _overview(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 60))).capitalize() + "."
+
+
+def _movie(rng: random.Random, tmdb_id: int) -> tuple:
+    year = None if rng.random() < 0.02 else min(2026, int(2026 - rng.expovariate(1 / 18)))
+    votes = int(rng.paretovariate(1.2)) - 1
+    return (
+        tmdb_id,
+        _title(rng),
+        year,
+        None if rng.random() < 0.1 else rng.randint(60, 200),
+        _overview(rng),
+        None if rng.random() < 0.05 else f"/{tmdb_id:x}.jpg",
+        None,
+        None if votes == 0 else round(rng.uniform(2, 9.5), 1),
+        votes,
+        round(rng.lognormvariate(1, 1.2), 3),
+        NOW,
+    )
+
+
+def generate(path: Path, movies: int, shares: int = 200, seed: int = 1) -> Path:
+    """Create a fresh catalog DB at path with the given number of movies."""
+    import db
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for suffix in ("", "-wal", "-shm"):
+        Path(str(path) + suffix).unlink(missing_ok=True)
+
+    rng = random.Random(seed)
+    saved, db.DB_PATH = db.DB_PATH, path
+    try:
+        db.init_db()
+    finally:
+        db.DB_PATH = saved
+
+    started = time.perf_counter()
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA synchronous=OFF")
+
+    people = max(10, movies // 4)
+    conn.executemany(
+        "INSERT INTO people (tmdb_person_id,name,gender,updated_at) VALUES (?,?,?,?)",
+        (
+            (pid, f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}", _gender(rng), NOW)
+            for pid in range(1, people + 1)
+        ),
+    )
+
+    chunk = 50_000
+    for start in range(1, movies + 1, chunk):
+        ids = range(start, min(start + chunk, movies + 1))
+        conn.executemany(
+            "INSERT INTO movies (tmdb_id,title,year,runtime,overview,poster_path,backdrop_path,"
+            "vote_avg,vote_count,popularity,updated_at) VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+            [_movie(rng, i) for i in ids],
+        )
+        credits = []
+        for i in ids:
+            credits.append((i, rng.randint(1, people)))
+            if rng.random() < MULTI_DIRECTOR_SHARE:
+                credits.append((i, rng.randint(1, people)))
+        conn.executemany("INSERT OR IGNORE INTO credits_director (tmdb_id,tmdb_person_id) VALUES (?,?)", credits)
+        conn.commit()
+
+    for n in range(shares):
+        token = f"bench{n:05d}"
+        conn.execute("INSERT INTO shared_sets (token,title,created_at) VALUES (?,?,?)", (token, _title(rng), NOW))
+        conn.executemany(
+            "INSERT OR IGNORE INTO shared_set_items (token,tmdb_id) VALUES (?,?)",
+            [(token, rng.randint(1, movies)) for _ in range(rng.randint(5, 50))],
+        )
+    conn.commit()
+    conn.close()
+    print(f"Generated {movies} movies, {people} people, {shares} shares in {time.perf_counter() - started:.1f}s -> {path}")
+    return path
+
+
+def _gender(rng: random.Random) -> int:
+    r = rng.random()
+    if r < FEMALE_SHARE:
+        return 1
+    if r < 0.9:
+        return 2
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic movie catalog DB.")
+    parser.add_argument("--movies", type=int, default=10_000, help="Number of movies (10k to 2M)")
+    parser.add_argument("--shares", type=int, default=200, help="Number of shared sets")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default="bench/data/catalog.sqlite3")
+    args = parser.parse_args()
+    generate(Path(args.out), args.movies, shares=args.shares, seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
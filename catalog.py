@@ -0,0 +1,419 @@
+"""In-memory snapshot of the women-directed catalog for serving browse() from RAM.
+
+Numeric columns live in array.array, strings in lists, and each sort order is a
+precomputed permutation of row positions. The snapshot is immutable; when the
+ingest pipeline bumps the catalog generation a new one is built and swapped in
+with a single reference assignment, so readers never see a half-loaded catalog.
+"""
+import heapq
+import math
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from db import connect_catalog
+from facets import COLUMN_FACETS, DIRECTOR_OPTIONS, VOTE_THRESHOLDS, narrow_years, rating_band, runtime_bucket
+from store import WOMEN_DIRECTED, catalog_generation
+
+CHECK_INTERVAL = 5.0  # seconds between generation checks
+TALLY_ROWS = 20_000  # director counts tally the matching rows' directors below this many matches
+
+SORT_COLUMNS = {
+    "popularity": "popularity",
+    "rating": "vote_avg",
+    "votes": "vote_count",
+    "year": "year",
+}
+
+NAN = float("nan")
+
+
+class CatalogMovie:
+    """One browse card; attribute names match the movies columns the templates use."""
+
+    __slots__ = ("tmdb_id", "title", "year", "vote_avg", "vote_count", "popularity", "poster_path", "overview")
+
+    def __init__(self, tmdb_id, title, year, vote_avg, vote_count, popularity, poster_path, overview):
+        self.tmdb_id = tmdb_id
+        self.title = title
+        self.year = year
+        self.vote_avg = vote_avg
+        self.vote_count = vote_count
+        self.popularity = popularity
+        self.poster_path = poster_path
+        self.overview = overview
+
+
+def _num(value) -> float:
+    return NAN if value is None else float(value)
+
+
+def _desc_nulls_last(col: array) -> array:
+    """Row positions ordered like ORDER BY col DESC NULLS LAST, ties in load order."""
+    return array("l", sorted(range(len(col)), key=lambda i: math.inf if math.isnan(col[i]) else -col[i]))
+
+
+def _opt(value: float, cast=float):
+    return None if math.isnan(value) else cast(value)
+
+
+def _bitmap(positions, size: int) -> int:
+    """Row positions as an int with bit i set for row i."""
+    buf = bytearray((size + 7) // 8)
+    for i in positions:
+        buf[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buf, "little")
+
+
+def _positions(bits: int, size: int):
+    """Set bit positions of a bitmap, ascending."""
+    for b, byte in enumerate(bits.to_bytes((size + 7) // 8, "little")):
+        while byte:
+            low = byte & -byte
+            yield (b << 3) + low.bit_length() - 1
+            byte ^= low
+
+
+class CatalogSnapshot:
+    __slots__ = (
+        "generation",
+        "ids",
+        "titles",
+        "titles_folded",
+        "poster_paths",
+        "overviews",
+        "columns",
+        "orders",
+        "year_order",
+        "year_sorted",
+        "all_bits",
+        "year_bits",
+        "facet_bits",
+        "facet_totals",
+        "director_ids",
+        "director_index",
+        "director_offsets",
+        "director_rows",
+        "row_offsets",
+        "row_director_index",
+        "director_names",
+        "_title_cache",
+    )
+
+    def __init__(self, generation: str, rows, directors=()):
+        self.generation = generation
+        self.ids = array("q")
+        self.titles = []
+        self.titles_folded = []
+        self.poster_paths = []
+        self.overviews = []
+        self.columns = {name: array("d") for name in ("year", "vote_avg", "vote_count", "popularity", "runtime")}
+
+        for r in rows:
+            self.ids.append(r["tmdb_id"])
+            self.titles.append(r["title"])
+            self.titles_folded.append(r["title"].casefold())
+            self.poster_paths.append(r["poster_path"])
+            self.overviews.append(r["overview"])
+            for name, col in self.columns.items():
+                col.append(_num(r[name]))
+
+        self.orders = {sort: _desc_nulls_last(self.columns[name]) for sort, name in SORT_COLUMNS.items()}
+
+        # Ascending by year (NULL years excluded) so a year range is two bisections.
+        year = self.columns["year"]
+        self.year_order = array("l", sorted((i for i in range(len(year)) if not math.isnan(year[i])), key=lambda i: year[i]))
+        self.year_sorted = array("d", (year[i] for i in self.year_order))
+
+        self._build_facets(directors)
+        self._title_cache = ("", self.all_bits)
+
+    def _build_facets(self, directors):
+        """Bitmaps for the column facets; directors get sparse row lists instead.
+
+        A bitmap costs len/8 bytes whatever its population, which is fine for the few
+        dozen column-facet options but not for tens of thousands of directors.
+        """
+        size = len(self.ids)
+        pos = {tmdb_id: i for i, tmdb_id in enumerate(self.ids)}
+        films: dict[int, list[int]] = {}
+        self.director_names = {}
+        for d in directors:
+            i = pos.get(d["tmdb_id"])
+            if i is not None:
+                films.setdefault(d["tmdb_person_id"], []).append(i)
+                self.director_names[d["tmdb_person_id"]] = d["name"]
+
+        # Directors most films first (the order facet_counts prunes in), their rows as one
+        # flat array sliced by offsets; and the inverse, row -> director indexes.
+        order = sorted(films, key=lambda pid: (-len(films[pid]), self.director_names[pid]))
+        self.director_ids = array("q", order)
+        self.director_index = {pid: k for k, pid in enumerate(order)}
+        self.director_offsets = array("l", [0])
+        self.director_rows = array("l")
+        per_row = [0] * (size + 1)
+        for pid in order:
+            rows = sorted(films[pid])
+            self.director_rows.extend(rows)
+            self.director_offsets.append(len(self.director_rows))
+            for i in rows:
+                per_row[i + 1] += 1
+        for i in range(size):
+            per_row[i + 1] += per_row[i]
+        self.row_offsets = array("l", per_row)
+        self.row_director_index = array("l", bytes(8 * len(self.director_rows)))
+        fill = per_row[:-1]
+        for k in range(len(order)):
+            for i in self.director_rows[self.director_offsets[k] : self.director_offsets[k + 1]]:
+                self.row_director_index[fill[i]] = k
+                fill[i] += 1
+
+        years: dict[int, list[int]] = {}
+        options: dict[str, dict] = {name: {} for name in COLUMN_FACETS}
+        c = self.columns
+        for i in range(size):
+            year = _opt(c["year"][i], int)
+            if year is not None:
+                years.setdefault(year, []).append(i)
+                options["decade"].setdefault(year // 10 * 10, []).append(i)
+            runtime = runtime_bucket(_opt(c["runtime"][i], int))
+            if runtime:
+                options["runtime"].setdefault(runtime, []).append(i)
+            rating = rating_band(_opt(c["vote_avg"][i]))
+            if rating:
+                options["rating"].setdefault(rating, []).append(i)
+            votes = c["vote_count"][i]
+            for key, (_, threshold) in VOTE_THRESHOLDS.items():
+                if votes >= threshold:
+                    options["votes"].setdefault(key, []).append(i)
+
+        self.all_bits = (1 << size) - 1
+        self.year_bits = {year: _bitmap(p, size) for year, p in years.items()}
+        self.facet_bits = {name: {key: _bitmap(p, size) for key, p in opts.items()} for name, opts in options.items()}
+        self.facet_totals = {name: {key: len(p) for key, p in opts.items()} for name, opts in options.items()}
+
+    def director_films(self, k: int) -> array:
+        """Row positions of the k-th director (director_ids order)."""
+        return self.director_rows[self.director_offsets[k] : self.director_offsets[k + 1]]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def record(self, pos: int) -> CatalogMovie:
+        c = self.columns
+        return CatalogMovie(
+            self.ids[pos],
+            self.titles[pos],
+            _opt(c["year"][pos], int),
+            _opt(c["vote_avg"][pos]),
+            _opt(c["vote_count"][pos], int),
+            _opt(c["popularity"][pos]),
+            self.poster_paths[pos],
+            self.overviews[pos],
+        )
+
+    def year_range(self, year_min: int | None, year_max: int | None) -> tuple[int, int]:
+        lo = 0 if year_min is None else bisect_left(self.year_sorted, year_min)
+        hi = len(self.year_sorted) if year_max is None else bisect_right(self.year_sorted, year_max)
+        return lo, max(lo, hi)
+
+    def years_bits(self, year_min: int | None, year_max: int | None) -> int:
+        bits = 0
+        for year, year_bits in self.year_bits.items():
+            if (year_min is None or year >= year_min) and (year_max is None or year <= year_max):
+                bits |= year_bits
+        return bits
+
+    def title_bits(self, q: str) -> int:
+        needle = q.casefold()
+        cached_needle, bits = self._title_cache
+        if cached_needle != needle:
+            bits = _bitmap((i for i, t in enumerate(self.titles_folded) if needle in t), len(self.ids))
+            self._title_cache = (needle, bits)  # browse and facet_counts share one scan per request
+        return bits
+
+    def match_bits(self, q: str, year_min, year_max, selected: dict, exclude: str | None = None) -> int:
+        """Rows matching every filter except facet `exclude`; decade is folded into the year range."""
+        if exclude != "decade":
+            year_min, year_max = narrow_years(year_min, year_max, selected.get("decade"))
+        bits = self.all_bits
+        if year_min is not None or year_max is not None:
+            bits &= self.years_bits(year_min, year_max)
+        if q:
+            bits &= self.title_bits(q)
+        for name, key in selected.items():
+            if name in ("decade", exclude):
+                continue
+            if name == "director":
+                k = self.director_index.get(key)
+                bits &= 0 if k is None else _bitmap(self.director_films(k), len(self.ids))
+            else:
+                bits &= self.facet_bits[name].get(key, 0)
+        return bits
+
+    def browse(
+        self,
+        q: str = "",
+        year_min: int | None = None,
+        year_max: int | None = None,
+        sort: str = "popularity",
+        offset: int = 0,
+        limit: int = 20,
+        facets: dict | None = None,
+    ) -> tuple[int, list[CatalogMovie]]:
+        """Same result as store.browse_movies: (total matching, records for the page)."""
+        selected = facets or {}
+        order = self.orders.get(sort, self.orders["popularity"])
+        years_only = not q and not any(name != "decade" for name in selected)
+        if years_only:
+            year_min, year_max = narrow_years(year_min, year_max, selected.get("decade"))
+
+            if year_min is None and year_max is None:
+                return len(self.ids), [self.record(i) for i in order[offset : offset + limit]]
+
+            if sort == "year":
+                # The year-sorted index already is the answer; walk it backwards for DESC.
+                lo, hi = self.year_range(year_min, year_max)
+                start = hi - offset
+                page = self.year_order[max(lo, start - limit) : max(lo, start)]
+                return hi - lo, [self.record(i) for i in reversed(page)]
+
+        bits = self.match_bits(q, year_min, year_max, selected)
+        mask = bits.to_bytes((len(self.ids) + 7) // 8, "little")
+        page = []
+        skipped = 0
+        for i in order:
+            if not mask[i >> 3] >> (i & 7) & 1:
+                continue
+            if skipped < offset:
+                skipped += 1
+                continue
+            page.append(self.record(i))
+            if len(page) >= limit:
+                break
+        return bits.bit_count(), page
+
+    def facet_counts(self, q: str = "", year_min=None, year_max=None, facets: dict | None = None) -> dict:
+        """Per facet, {option key: matching rows} with every other filter applied.
+
+        Directors only include those facets.options() can show: the DIRECTOR_OPTIONS
+        with most matches (ties may add a few) and the selected one.
+        """
+        selected = facets or {}
+        out = {}
+        for name in COLUMN_FACETS:
+            bits = self.match_bits(q, year_min, year_max, selected, exclude=name)
+            if bits == self.all_bits:
+                out[name] = dict(self.facet_totals[name])
+            else:
+                out[name] = {key: (bits & option).bit_count() for key, option in self.facet_bits[name].items()}
+        bits = self.match_bits(q, year_min, year_max, selected, exclude="director")
+        out["director"] = self.director_counts(bits, selected.get("director"))
+        return out
+
+    def director_counts(self, bits: int, chosen: int | None = None) -> dict[int, int]:
+        size = len(self.ids)
+        offsets = self.director_offsets
+        if bits == self.all_bits:
+            top = range(min(DIRECTOR_OPTIONS, len(self.director_ids)))
+            counts = {self.director_ids[k]: offsets[k + 1] - offsets[k] for k in top}
+        elif bits.bit_count() <= TALLY_ROWS:
+            # Few matching rows: tally their directors.
+            counts = {}
+            for i in _positions(bits, size):
+                for j in range(self.row_offsets[i], self.row_offsets[i + 1]):
+                    pid = self.director_ids[self.row_director_index[j]]
+                    counts[pid] = counts.get(pid, 0) + 1
+        else:
+            # Many matching rows: count directors most films first. A director's matches can't
+            # exceed their film count, so stop once that is below the current top-N's lowest.
+            mask = bits.to_bytes((size + 7) // 8, "little")
+            counts, best = {}, []
+            for k in range(len(self.director_ids)):
+                if len(best) >= DIRECTOR_OPTIONS and offsets[k + 1] - offsets[k] < best[0]:
+                    break
+                n = sum(mask[i >> 3] >> (i & 7) & 1 for i in self.director_films(k))
+                if n:
+                    counts[self.director_ids[k]] = n
+                if len(best) < DIRECTOR_OPTIONS:
+                    heapq.heappush(best, n)
+                elif n > best[0]:
+                    heapq.heapreplace(best, n)
+
+        k = self.director_index.get(chosen)
+        if k is not None and chosen not in counts:
+            if bits == self.all_bits:
+                counts[chosen] = offsets[k + 1] - offsets[k]
+            else:
+                mask = bits.to_bytes((size + 7) // 8, "little")
+                counts[chosen] = sum(mask[i >> 3] >> (i & 7) & 1 for i in self.director_films(k))
+        return counts
+
+
+def load_snapshot() -> CatalogSnapshot:
+    generation = catalog_generation()
+    with connect_catalog() as conn:
+        rows = conn.execute(
+            f"""
+            SELECT m.tmdb_id, m.title, m.year, m.vote_avg, m.vote_count, m.popularity, m.runtime,
+                   m.poster_path, m.overview
+            FROM movies m
+            WHERE m.tmdb_id IN ({WOMEN_DIRECTED})
+            ORDER BY m.tmdb_id
+            """
+        ).fetchall()
+        # Only women directors become facet options; co-directors of either gender stay unlisted.
+        directors = conn.execute(
+            """
+            SELECT cd.tmdb_id, cd.tmdb_person_id, p.name
+            FROM credits_director cd
+            JOIN people p ON p.tmdb_person_id = cd.tmdb_person_id
+            WHERE p.gender = 1
+            """
+        ).fetchall()
+    return CatalogSnapshot(generation, rows, directors)
+
+
+_snapshot: CatalogSnapshot | None = None
+_checked_at = 0.0
+_reload_lock = threading.Lock()  # held while checking the generation or building a snapshot
+
+
+def _reload() -> None:
+    global _snapshot
+    try:
+        _snapshot = load_snapshot()
+    finally:
+        _reload_lock.release()
+
+
+def current() -> CatalogSnapshot:
+    """The live snapshot, reloaded when the catalog generation changes (checked every CHECK_INTERVAL).
+
+    Only the first load happens on a request; later ones build the new snapshot in a
+    background thread while every request keeps getting the old one.
+    """
+    global _snapshot, _checked_at
+
+    snap = _snapshot
+    now = time.monotonic()
+    if snap is not None and now - _checked_at < CHECK_INTERVAL:
+        return snap
+
+    # One thread checks/reloads; the others keep serving the old snapshot meanwhile.
+    if not _reload_lock.acquire(blocking=snap is None):
+        return snap
+    handed_off = False
+    try:
+        snap = _snapshot
+        if snap is None:
+            snap = _snapshot = load_snapshot()
+        elif catalog_generation() != snap.generation:
+            threading.Thread(target=_reload, name="catalog-reload", daemon=True).start()
+            handed_off = True  # _reload releases the lock when the new snapshot is live
+        _checked_at = time.monotonic()
+        return snap
+    finally:
+        if not handed_off:
+            _reload_lock.release()
@@ -0,0 +1,140 @@
+"""gzip/brotli response compression for the Flask app and the static export.
+
+HTML, CSS, JS and other text responses are encoded according to Accept-Encoding;
+brotli is preferred when the optional brotli package is installed, gzip otherwise.
+Dynamic pages are compressed on every request at a fast level: each carries a
+freshly masked CSRF token (app.mask_csrf, which keeps the token safe from
+BREACH while the page also echoes the query), so no two bodies are alike and a
+cache of them would not hit. Files under static/ are compressed at the highest
+level once per mtime and served from memory. The static export writes
+.gz/.br siblings next to each page for nginx's gzip_static/brotli_static.
+
+COMPRESSION=false turns it off, e.g. behind a proxy that already compresses.
+"""
+import gzip
+import os
+import threading
+from functools import cache
+from pathlib import Path
+
+from flask import request
+from werkzeug.security import safe_join
+
+from profiling import APP_METRICS
+
+COMPRESSIBLE = {"text/html", "text/css", "text/plain", "text/javascript", "application/javascript", "application/json", "image/svg+xml"}
+MIN_BYTES = 512  # below this the headers cost more than the saving
+SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+# (gzip level, brotli quality): fast enough per request; exported pages, of which there are
+# many (brotli 11 costs ~70 ms a page, 9 ~9 ms for a few % more bytes); shared assets, compressed once.
+DYNAMIC = (6, 5)
+PAGE = (9, 9)
+ONCE = (9, 11)
+
+
+@cache
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def available() -> tuple[str, ...]:
+    """Supported encodings, most preferred first."""
+    return ("br", "gzip") if _brotli() else ("gzip",)
+
+
+def negotiate(accept_encodings) -> str | None:
+    """The preferred encoding the client accepts (werkzeug Accept), or None for identity."""
+    for encoding in available():
+        if accept_encodings.quality(encoding) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str, levels: tuple[int, int] = DYNAMIC) -> bytes:
+    if encoding == "br":
+        return _brotli().compress(body, quality=levels[1])
+    return gzip.compress(body, compresslevel=levels[0], mtime=0)  # mtime=0: same input, same bytes
+
+
+class StaticFiles:
+    """Best-level encodings of static files, recompressed when the file's mtime changes."""
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self._entries: dict[tuple[str, str], tuple[int, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, filename: str, encoding: str) -> bytes | None:
+        path = safe_join(self.folder, filename)
+        if path is None or not os.path.isfile(path):
+            return None
+        mtime = os.stat(path).st_mtime_ns
+        key = (filename, encoding)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or entry[0] != mtime:
+            entry = (mtime, compress(Path(path).read_bytes(), encoding, ONCE))
+            with self._lock:
+                self._entries[key] = entry
+        return entry[1]
+
+
+def write_precompressed(path: Path, levels: tuple[int, int] = ONCE) -> list[Path]:
+    """Write .gz (and .br when available) siblings of path; returns the files written."""
+    body = path.read_bytes()
+    written = []
+    for encoding in available():
+        dest = path.with_name(path.name + SUFFIXES[encoding])
+        tmp = dest.with_name(dest.name + ".tmp")
+        tmp.write_bytes(compress(body, encoding, levels))
+        os.replace(tmp, dest)
+        written.append(dest)
+    return written
+
+
+def init_compression(app) -> None:
+    if os.getenv("COMPRESSION", "true").lower() not in ("true", "1", "yes"):
+        return
+
+    static = StaticFiles(app.static_folder)
+
+    @app.after_request
+    def _compress(response):
+        if response.mimetype not in COMPRESSIBLE:
+            return response
+        response.vary.add("Accept-Encoding")
+        if response.status_code != 200 or "Content-Encoding" in response.headers:
+            return response
+        encoding = negotiate(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        if request.endpoint == "static":
+            # send_static_file streams the file; swap in the cached encoding and keep conditional GETs working.
+            data = static.get(request.view_args["filename"], encoding)
+            if data is None:
+                return response
+            etag, _ = response.get_etag()
+            response.direct_passthrough = False
+            response.set_data(data)
+            if etag:
+                response.set_etag(f"{etag}-{encoding}")
+            response.headers["Content-Encoding"] = encoding
+            return response.make_conditional(request)
+
+        if response.is_streamed:
+            return response
+        body = response.get_data()
+        if len(body) < MIN_BYTES:
+            return response
+        data = compress(body, encoding)
+        response.set_data(data)
+        response.headers["Content-Encoding"] = encoding
+        APP_METRICS.inc("compression_bytes_total", len(body), stage="identity")
+        APP_METRICS.inc("compression_bytes_total", len(data), stage=encoding)
+        return response
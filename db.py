@@ -1,13 +1,151 @@
+import os
 import sqlite3
+import time
 from pathlib import Path
 
 DB_PATH = Path("movies.sqlite3")
 
+_query_observer = None
+
+
+def set_query_observer(fn) -> None:
+    """Call fn(sql, params, seconds) after every execute()/executemany() on new connections; None disables."""
+    global _query_observer
+    _query_observer = fn
+
+
+class TracedConnection(sqlite3.Connection):
+    # Times the execute call itself, which for SQLite runs the statement up to its first row:
+    # sorts, aggregates and COUNT(*) are included, fetching later rows is not.
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            observer = _query_observer
+            if observer is not None:
+                observer(sql, parameters, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            observer = _query_observer
+            if observer is not None:
+                observer(sql, None, time.perf_counter() - start)
+
+
 def connect():
-    conn = sqlite3.connect(DB_PATH)
+    factory = TracedConnection if _query_observer is not None else sqlite3.Connection
+    conn = sqlite3.connect(DB_PATH, factory=factory)
     conn.row_factory = sqlite3.Row
     return conn
 
+
+# Published read-only snapshots of the working DB live next to it; CURRENT names the live one.
+_published: tuple = (None, None)  # ((inode, mtime) of CURRENT, snapshot path)
+
+
+def snapshot_dir() -> Path:
+    return DB_PATH.parent / "snapshots"
+
+
+def published_path() -> Path | None:
+    """The snapshot CURRENT points at (re-read only when the pointer file is replaced), or None."""
+    global _published
+    pointer = snapshot_dir() / "CURRENT"
+    try:
+        st = pointer.stat()
+    except FileNotFoundError:
+        return None
+    stamp = (st.st_ino, st.st_mtime_ns)
+    if _published[0] != stamp:
+        _published = (stamp, snapshot_dir() / pointer.read_text(encoding="utf-8").strip())
+    return _published[1]
+
+
+def connect_catalog():
+    """Connection for catalog reads: the published snapshot, opened immutable (no locks, no WAL),
+    or the working DB until a snapshot has been published."""
+    path = published_path()
+    if path is None:
+        return connect()
+    factory = TracedConnection if _query_observer is not None else sqlite3.Connection
+    conn = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro&immutable=1", uri=True, factory=factory)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _write_pointer(name: str, value: str) -> None:
+    pointer = snapshot_dir() / name
+    tmp = pointer.with_name(name + ".tmp")
+    tmp.write_text(value + "\n", encoding="utf-8")
+    os.replace(tmp, pointer)
+
+
+def _read_pointer(name: str) -> str | None:
+    try:
+        return (snapshot_dir() / name).read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def publish_snapshot(keep: int = 3) -> Path:
+    """VACUUM INTO a compacted copy of the working DB, check it, then switch CURRENT to it.
+
+    The old CURRENT becomes PREVIOUS for rollback_snapshot(). Readers pick the
+    new file up on their next connect_catalog(); open connections finish on the
+    old one. Only the newest `keep` snapshots (plus CURRENT/PREVIOUS) are kept.
+    """
+    snap_dir = snapshot_dir()
+    snap_dir.mkdir(parents=True, exist_ok=True)
+    stamp = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+    name = f"catalog-{stamp}.sqlite3"
+    n = 1
+    while (snap_dir / name).exists():
+        n += 1
+        name = f"catalog-{stamp}-{n}.sqlite3"
+    tmp = snap_dir / (name + ".tmp")
+    tmp.unlink(missing_ok=True)
+
+    with connect() as conn:
+        conn.execute("VACUUM INTO ?", (str(tmp),))
+
+    check = sqlite3.connect(tmp)
+    try:
+        check.execute("PRAGMA journal_mode=DELETE")  # immutable readers never look for -wal/-shm
+        status = check.execute("PRAGMA quick_check").fetchone()[0]
+    finally:
+        check.close()
+    if status != "ok":
+        tmp.unlink(missing_ok=True)
+        raise RuntimeError(f"Snapshot failed quick_check: {status}")
+
+    os.replace(tmp, snap_dir / name)
+    current = _read_pointer("CURRENT")
+    if current:
+        _write_pointer("PREVIOUS", current)
+    _write_pointer("CURRENT", name)
+
+    pinned = {name, current}
+    published = sorted(snap_dir.glob("catalog-*.sqlite3"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in published[keep:]:
+        if old.name not in pinned:
+            old.unlink(missing_ok=True)
+    return snap_dir / name
+
+
+def rollback_snapshot() -> Path:
+    """Swap CURRENT and PREVIOUS, so the previous snapshot is live again."""
+    current, previous = _read_pointer("CURRENT"), _read_pointer("PREVIOUS")
+    if not previous or not (snapshot_dir() / previous).exists():
+        raise RuntimeError("No previous snapshot to roll back to")
+    _write_pointer("CURRENT", previous)
+    if current:
+        _write_pointer("PREVIOUS", current)
+    return snapshot_dir() / previous
+
 def init_db():
     schema = Path("schema.sql").read_text(encoding="utf-8")
     with connect() as conn:
@@ -0,0 +1,201 @@
+"""Browse facets shared by the SQL browse query and the catalog snapshot.
+
+A selection is a dict of facet name -> option key, one option per facet, parsed
+from the query string. Decade narrows the year range; runtime and rating are
+half-open bands; votes is a minimum threshold; director is a TMDb person id.
+"""
+
+FACET_NAMES = ("decade", "runtime", "rating", "votes", "director")
+COLUMN_FACETS = ("decade", "runtime", "rating", "votes")  # a function of one movie row; director is not
+
+# key: (label, lower bound inclusive, upper bound exclusive)
+RUNTIME_BUCKETS = {
+    "short": ("Under 90 min", None, 90),
+    "feature": ("90–119 min", 90, 120),
+    "long": ("120–149 min", 120, 150),
+    "epic": ("150 min +", 150, None),
+}
+
+RATING_BANDS = {
+    "8": ("★ 8+", 8, None),
+    "7": ("★ 7–8", 7, 8),
+    "6": ("★ 6–7", 6, 7),
+    "0": ("★ under 6", None, 6),
+}
+
+VOTE_THRESHOLDS = {
+    "100": ("100+ votes", 100),
+    "1000": ("1,000+ votes", 1000),
+    "10000": ("10,000+ votes", 10000),
+}
+
+FIXED_OPTIONS = {"runtime": RUNTIME_BUCKETS, "rating": RATING_BANDS, "votes": VOTE_THRESHOLDS}
+
+DIRECTOR_OPTIONS = 15  # directors listed in the facet; a selected one is always shown
+
+
+def parse(args) -> dict:
+    """Valid facet selections from request args; unknown values are dropped."""
+    selected = {}
+    decade = (args.get("decade") or "").strip()
+    if decade.isdigit() and int(decade) % 10 == 0:
+        selected["decade"] = int(decade)
+    for name, fixed in FIXED_OPTIONS.items():
+        value = (args.get(name) or "").strip()
+        if value in fixed:
+            selected[name] = value
+    director = (args.get("director") or "").strip()
+    if director.isdigit():
+        selected["director"] = int(director)
+    return selected
+
+
+def narrow_years(year_min: int | None, year_max: int | None, decade: int | None) -> tuple[int | None, int | None]:
+    """Intersect the year range with a decade, so both browse paths reuse their year handling."""
+    if decade is None:
+        return year_min, year_max
+    lo, hi = decade, decade + 9
+    return (lo if year_min is None else max(year_min, lo)), (hi if year_max is None else min(year_max, hi))
+
+
+def _in_band(value, lo, hi) -> bool:
+    return value is not None and (lo is None or value >= lo) and (hi is None or value < hi)
+
+
+def runtime_bucket(runtime) -> str | None:
+    for key, (_, lo, hi) in RUNTIME_BUCKETS.items():
+        if _in_band(runtime, lo, hi):
+            return key
+    return None
+
+
+def rating_band(vote_avg) -> str | None:
+    for key, (_, lo, hi) in RATING_BANDS.items():
+        if _in_band(vote_avg, lo, hi):
+            return key
+    return None
+
+
+def bucket_sql(col: str, buckets: dict) -> str:
+    """CASE expression giving the same key as runtime_bucket()/rating_band() for col."""
+    whens = []
+    for key, (_, lo, hi) in buckets.items():
+        conds = [f"{col} IS NOT NULL"]
+        if lo is not None:
+            conds.append(f"{col} >= {lo}")
+        if hi is not None:
+            conds.append(f"{col} < {hi}")
+        whens.append(f"WHEN {' AND '.join(conds)} THEN '{key}'")
+    return f"CASE {' '.join(whens)} END"
+
+
+def votes_level_sql(col: str) -> str:
+    """CASE expression giving the highest vote threshold col reaches, else 0."""
+    thresholds = sorted((t for _, t in VOTE_THRESHOLDS.values()), reverse=True)
+    return "CASE " + " ".join(f"WHEN {col} >= {t} THEN {t}" for t in thresholds) + " ELSE 0 END"
+
+
+def cube_counts(cells, selected: dict) -> dict:
+    """Counts for COLUMN_FACETS from (year, runtime, rating, votes level, n) cells.
+
+    Cells must already be limited to the year range and any title/director filter;
+    each facet's counts apply the other selected column facets, as on the snapshot.
+    """
+    counts = {name: {} for name in COLUMN_FACETS}
+    min_votes = VOTE_THRESHOLDS[selected["votes"]][1] if "votes" in selected else None
+    for year, runtime, rating, votes, n in cells:
+        decade = None if year is None else year // 10 * 10
+        failed = [
+            name
+            for name, ok in (
+                ("decade", "decade" not in selected or decade == selected["decade"]),
+                ("runtime", "runtime" not in selected or runtime == selected["runtime"]),
+                ("rating", "rating" not in selected or rating == selected["rating"]),
+                ("votes", min_votes is None or votes >= min_votes),
+            )
+            if not ok
+        ]
+        if len(failed) > 1:
+            continue
+        keys = {
+            "decade": [decade] if decade is not None else [],
+            "runtime": [runtime] if runtime else [],
+            "rating": [rating] if rating else [],
+            "votes": [key for key, (_, t) in VOTE_THRESHOLDS.items() if votes >= t],
+        }
+        for name in ([failed[0]] if failed else COLUMN_FACETS):
+            for key in keys[name]:
+                counts[name][key] = counts[name].get(key, 0) + n
+    return counts
+
+
+def decade_label(decade: int) -> str:
+    return f"{decade}s"
+
+
+def sql_terms(selected: dict) -> tuple[list[str], list]:
+    """WHERE terms (against movies m) for every facet except decade, which narrow_years handles."""
+    terms, params = [], []
+
+    def band(col, lo, hi):
+        if lo is not None:
+            terms.append(f"{col} >= ?")
+            params.append(lo)
+        if hi is not None:
+            terms.append(f"{col} < ?")
+            params.append(hi)
+
+    if "runtime" in selected:
+        _, lo, hi = RUNTIME_BUCKETS[selected["runtime"]]
+        band("m.runtime", lo, hi)
+    if "rating" in selected:
+        _, lo, hi = RATING_BANDS[selected["rating"]]
+        band("m.vote_avg", lo, hi)
+    if "votes" in selected:
+        terms.append("m.vote_count >= ?")
+        params.append(VOTE_THRESHOLDS[selected["votes"]][1])
+    if "director" in selected:
+        terms.append("m.tmdb_id IN (SELECT fd.tmdb_id FROM credits_director fd WHERE fd.tmdb_person_id = ?)")
+        params.append(selected["director"])
+    return terms, params
+
+
+FACET_TITLES = {
+    "decade": "Decade",
+    "runtime": "Runtime",
+    "rating": "Rating",
+    "votes": "Votes",
+    "director": "Director",
+}
+
+
+def options(counts: dict, selected: dict, director_names: dict) -> list[dict]:
+    """Facet groups for the template: [{name, title, options: [(key, label, count, is_selected)]}]."""
+    groups = []
+    for name in FACET_NAMES:
+        facet_counts = counts.get(name, {})
+        if name == "decade":
+            keys = sorted(facet_counts, reverse=True)
+        elif name == "director":
+            keys = sorted((k for k, n in facet_counts.items() if n), key=lambda k: (-facet_counts[k], director_names.get(k, "")))
+            keys = keys[:DIRECTOR_OPTIONS]
+        else:
+            keys = list(FIXED_OPTIONS[name])
+        if name in selected and selected[name] not in keys:
+            keys.append(selected[name])
+
+        opts = []
+        for key in keys:
+            count = facet_counts.get(key, 0)
+            if not count and selected.get(name) != key:
+                continue
+            if name == "decade":
+                label = decade_label(key)
+            elif name == "director":
+                label = director_names.get(key, f"#{key}")
+            else:
+                label = FIXED_OPTIONS[name][key][0]
+            opts.append((key, label, count, selected.get(name) == key))
+        if opts:
+            groups.append({"name": name, "title": FACET_TITLES[name], "options": opts})
+    return groups
@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+
+# Seconds. Covers sub-millisecond SQLite calls up to slow TMDb/CDN requests.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the q-th observation (the largest bucket for +Inf)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return self.buckets[min(i, len(self.buckets) - 1)]
+        return self.buckets[-1]
+
+
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labels: tuple, extra: tuple = ()) -> str:
+    items = labels + extra
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+class Registry:
+    """Thread-safe counters, gauges and histograms rendered in the Prometheus text format."""
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.counters: dict[tuple[str, tuple], float] = {}
+        self.gauges: dict[tuple[str, tuple], float] = {}
+        self.histograms: dict[tuple[str, tuple], Histogram] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = (name, _labels(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        with self.lock:
+            self.gauges[(name, _labels(labels))] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, _labels(labels))
+        with self.lock:
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = Histogram()
+            h.observe(value)
+
+    @contextmanager
+    def time(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def counter(self, name: str, since: dict | None = None, **labels) -> float:
+        """Counter value, minus its value in `since` (a snapshot from counters_snapshot())."""
+        key = (name, _labels(labels))
+        return self.counters.get(key, 0.0) - (since or {}).get(key, 0.0)
+
+    def counters_snapshot(self) -> dict:
+        with self.lock:
+            return dict(self.counters)
+
+    def histogram(self, name: str, **labels) -> Histogram | None:
+        return self.histograms.get((name, _labels(labels)))
+
+    def clear_gauges(self, name: str) -> None:
+        with self.lock:
+            for key in [k for k in self.gauges if k[0] == name]:
+                del self.gauges[key]
+
+    def render(self) -> str:
+        lines = []
+        with self.lock:
+            for kind, series in (("counter", self.counters), ("gauge", self.gauges)):
+                typed = set()
+                for (name, labels), value in sorted(series.items()):
+                    full = f"{self.prefix}_{name}"
+                    if full not in typed:
+                        lines.append(f"# TYPE {full} {kind}")
+                        typed.add(full)
+                    lines.append(f"{full}{_fmt_labels(labels)} {value:g}")
+
+            typed = set()
+            for (name, labels), h in sorted(self.histograms.items(), key=lambda kv: kv[0]):
+                full = f"{self.prefix}_{name}"
+                if full not in typed:
+                    lines.append(f"# TYPE {full} histogram")
+                    typed.add(full)
+                cumulative = 0
+                for bound, n in zip(h.buckets, h.counts):
+                    cumulative += n
+                    lines.append(f"{full}_bucket{_fmt_labels(labels, (('le', f'{bound:g}'),))} {cumulative}")
+                lines.append(f"{full}_bucket{_fmt_labels(labels, (('le', '+Inf'),))} {h.count}")
+                lines.append(f"{full}_sum{_fmt_labels(labels)} {h.sum:g}")
+                lines.append(f"{full}_count{_fmt_labels(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: Path) -> None:
+        """Write render() atomically, as the node_exporter textfile collector expects."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(self.render(), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def summary(self, since: dict | None = None) -> dict:
+        """Compact JSON-friendly view: counters (minus `since`) plus count/mean/p50/p95 per histogram."""
+        since = since or {}
+        with self.lock:
+            out = {"counters": {}, "histograms": {}}
+            for key, value in self.counters.items():
+                name, labels = key
+                out["counters"][name + _fmt_labels(labels)] = value - since.get(key, 0.0)
+            for (name, labels), h in self.histograms.items():
+                out["histograms"][name + _fmt_labels(labels)] = {
+                    "count": h.count,
+                    "mean": h.sum / h.count if h.count else None,
+                    "p50": h.quantile(0.5),
+                    "p95": h.quantile(0.95),
+                }
+        return out
@@ -0,0 +1,144 @@
+"""Opt-in request instrumentation for the Flask app.
+
+METRICS_ENABLED=true records per-route latency, SQL timing (via db.set_query_observer),
+template render time and poster cache hits, and serves them at /metrics.
+PROFILE_SLOW_MS=<ms> additionally samples request threads and writes collapsed stacks
+(flamegraph.pl / speedscope format) to PROFILE_DIR for requests slower than that.
+"""
+import hashlib
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from flask import Response, before_render_template, g, has_request_context, request, template_rendered
+
+import db
+from metrics import Registry
+
+APP_METRICS = Registry("moviebrowser_app")
+
+_IN_LIST = re.compile(r"IN \((\?,?\s*)+\)")
+_SPACE = re.compile(r"\s+")
+
+
+def sql_fingerprint(sql: str) -> str:
+    """Metric label for a statement; long ones become a readable prefix plus a hash of the
+    whole text, so statements differing only near the end (e.g. ORDER BY) stay apart."""
+    sql = _SPACE.sub(" ", sql).strip()
+    sql = _IN_LIST.sub("IN (…)", sql)
+    if len(sql) <= 120:
+        return sql
+    return f"{sql[:100]}… #{hashlib.blake2b(sql.encode('utf-8'), digest_size=4).hexdigest()}"
+
+
+def record_poster_cache(hit: bool) -> None:
+    APP_METRICS.inc("poster_cache_total", result="hit" if hit else "miss")
+
+
+class StackSampler:
+    """Background thread sampling the Python stacks of registered request threads."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.active: dict[int, Counter] = {}
+        self.thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self.thread.start()
+
+    def start(self, thread_id: int) -> None:
+        with self.lock:
+            self.active[thread_id] = Counter()
+
+    def stop(self, thread_id: int) -> Counter:
+        with self.lock:
+            return self.active.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                if not self.active:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, samples in self.active.items():
+                    frame = frames.get(thread_id)
+                    if frame is None:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                        frame = frame.f_back
+                    samples[";".join(reversed(stack))] += 1
+
+
+def write_collapsed(out_dir: Path, name: str, samples: Counter) -> Path:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / f"{time.strftime('%Y%m%dT%H%M%S')}-{name}-{threading.get_ident()}.folded"
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, n in samples.most_common():
+            f.write(f"{stack} {n}\n")
+    return path
+
+
+def init_profiling(app) -> None:
+    enabled = os.getenv("METRICS_ENABLED", "false").lower() in ("true", "1", "yes")
+    slow_ms = float(os.getenv("PROFILE_SLOW_MS", "0") or 0)
+    if not enabled and slow_ms <= 0:
+        return
+
+    profile_dir = Path(os.getenv("PROFILE_DIR", "logs/profiles"))
+    sampler = StackSampler() if slow_ms > 0 else None
+
+    def on_query(sql, params, seconds):
+        endpoint = (request.endpoint if has_request_context() else None) or "-"
+        APP_METRICS.observe("sql_seconds", seconds, endpoint=endpoint, query=sql_fingerprint(sql))
+
+    if enabled:
+        db.set_query_observer(on_query)
+
+    @app.before_request
+    def _start_timer():
+        g.request_started = time.perf_counter()
+        if sampler:
+            sampler.start(threading.get_ident())
+
+    @app.teardown_request
+    def _stop_timer(exc):
+        started = g.pop("request_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or "-"
+        if enabled:
+            APP_METRICS.observe("request_seconds", elapsed, endpoint=endpoint)
+        if sampler:
+            samples = sampler.stop(threading.get_ident())
+            if elapsed * 1000 >= slow_ms and samples:
+                path = write_collapsed(profile_dir, endpoint, samples)
+                app.logger.warning("Slow request %s %.0fms, stacks in %s", request.full_path, elapsed * 1000, path)
+
+    if not enabled:
+        return
+
+    @before_render_template.connect_via(app)
+    def _template_started(sender, template, context, **extra):
+        g.template_started = time.perf_counter()
+
+    @template_rendered.connect_via(app)
+    def _template_done(sender, template, context, **extra):
+        started = g.pop("template_started", None)
+        if started is not None:
+            APP_METRICS.observe("template_seconds", time.perf_counter() - started, template=template.name)
+
+    @app.get("/metrics")
+    def metrics():
+        hits = APP_METRICS.counter("poster_cache_total", result="hit")
+        misses = APP_METRICS.counter("poster_cache_total", result="miss")
+        if hits + misses:
+            APP_METRICS.set("poster_cache_hit_ratio", hits / (hits + misses))
+        return Response(APP_METRICS.render(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,308 @@
+"""Query-plan regression check for every catalog query.
+
+Exercises the app routes, store helpers and ingest queue functions against a
+scratch copy of a populated DB, captures every SQL statement they run (via
+db.set_query_observer), then runs EXPLAIN QUERY PLAN on each and flags full
+scans and temp B-tree sorts, with an index recommendation where one applies.
+
+    python query_plans.py --db movies.sqlite3            # report
+    python query_plans.py --db movies.sqlite3 --check    # exit 1 on unreviewed flags
+    python query_plans.py --db movies.sqlite3 --apply    # create recommended indexes
+"""
+import argparse
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+import db
+
+SOURCES = {"app.py", "store.py", "tmdb_ingest.py", "warming.py"}
+
+# Flags that were reviewed and are expected: (substring of the normalized SQL, exact plan line).
+# Any other flagged line of a matching statement still fails --check.
+ACCEPTED = {
+    ("m.title LIKE ?", "SCAN m USING COVERING INDEX idx_movies_title"): "substring title search cannot use an index",
+    ("ORDER BY p.name", "USE TEMP B-TREE FOR ORDER BY"): "sorts the handful of directors of one movie",
+    ("GROUP BY status", "SCAN ingest_queue USING COVERING INDEX idx_ingest_status"): "stats only; scans idx_ingest_status",
+    (
+        "IN ('pending','failed') AND attempts",
+        "USE TEMP B-TREE FOR ORDER BY",
+    ): "merges the pending and failed ranges of the partial index; the sort only sees claimable rows",
+    ("fd.tmdb_person_id = ?", "USE TEMP B-TREE FOR ORDER BY"): "one director's filmography is looked up by idx_cd_person and sorted",
+    ("ORDER BY m.year DESC NULLS LAST, m.title", "USE TEMP B-TREE FOR ORDER BY"): "sorts one director's filmography",
+    (
+        "SET hits = hits / 2",
+        "SCAN access_stats",
+    ): "warm-run decay rewrites every row of a small table (one per page, share and size)",
+    ("access_stats WHERE hits = 0", "SCAN access_stats"): "warm-run cleanup right after the decay scan",
+    (
+        "m.runtime >= ?",
+        "USE TEMP B-TREE FOR ORDER BY",
+    ): "facet bands; the planner searches the narrowest band's index and sorts only its matches",
+    ("FROM facet_cube", "SCAN facet_cube"): "summing a few thousand cube cells is cheaper than keeping an index on them",
+    (
+        "INSERT INTO facet_cube",
+        "USE TEMP B-TREE FOR GROUP BY",
+    ): "rebuilt once per catalog generation, grouping every women-directed movie",
+}
+
+_SPACE = re.compile(r"\s+")
+_FROM = re.compile(r"\bFROM\s+(\w+)(?:\s+(?:AS\s+)?(?!WHERE|JOIN|ORDER|GROUP|LIMIT)(\w+))?", re.I)
+_ORDER = re.compile(r"\bORDER BY\s+(.+?)(?:\bLIMIT\b|$)", re.I)
+_TERM = re.compile(r"(?<![\w.+])(?:(\w+)\.)?([A-Za-z_]\w*)\s*(=|>=|<=|<|>|\bIN\b)", re.I)
+
+
+def normalize(sql: str) -> str:
+    return _SPACE.sub(" ", sql).strip()
+
+
+def caller() -> str:
+    frame = sys._getframe(2)
+    while frame is not None:
+        name = Path(frame.f_code.co_filename).name
+        if name in SOURCES:
+            return f"{Path(name).stem}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "?"
+
+
+def capture_statements(db_path: Path) -> dict[str, dict]:
+    """Run the app, store and ingest code paths against db_path and return statements by normalized SQL."""
+    import store
+    import tmdb_ingest
+    import warming
+    from app import ACCESS_LOG, app, mask_csrf
+
+    captured: dict[str, dict] = {}
+
+    def observe(sql, params, seconds):
+        key = normalize(sql)
+        if key.upper().startswith(("PRAGMA", "EXPLAIN")):
+            return
+        entry = captured.setdefault(key, {"sql": sql, "params": params, "sources": set()})
+        entry["sources"].add(caller())
+
+    saved_path = db.DB_PATH
+    db.DB_PATH = db_path
+    db.set_query_observer(observe)
+    try:
+        with db.connect() as conn:
+            movie = conn.execute(
+                "SELECT tmdb_id FROM movies WHERE poster_path IS NOT NULL ORDER BY popularity DESC LIMIT 1"
+            ).fetchone()
+            share = conn.execute("SELECT token FROM shared_sets LIMIT 1").fetchone()
+        movie_id = movie["tmdb_id"] if movie else 1
+
+        client = app.test_client()
+        for sort in ("popularity", "rating", "votes", "year"):
+            for params in (
+                {},
+                {"year_min": "1990", "year_max": "2010"},
+                {"year_min": "2000"},
+                {"q": "night"},
+                {"decade": "1990", "runtime": "feature", "rating": "7", "votes": "100"},
+                {"director": "1"},
+            ):
+                for page in ("1", "3"):
+                    client.get("/", query_string=dict(params, sort=sort, page=page))
+        client.get(f"/movie/{movie_id}")
+        for sort in ("films", "rating"):
+            client.get("/directors", query_string={"sort": sort, "page": "2"})
+        with db.connect() as conn:
+            person = conn.execute("SELECT tmdb_person_id FROM director_stats WHERE gender = 1 ORDER BY film_count DESC LIMIT 1").fetchone()
+        if person:
+            client.get(f"/director/{person['tmdb_person_id']}")
+        if share:
+            client.get(f"/s/{share['token']}")
+        with client.session_transaction() as s:
+            s["csrf"] = "plan"
+            s["basket"] = [movie_id]
+        client.get("/basket")
+        client.post("/basket/share", data={"csrf": mask_csrf("plan"), "title": "plans"})
+        if share:
+            client.post(f"/s/{share['token']}/fork", data={"csrf": mask_csrf("plan")})
+
+        store.poster_path_for(movie_id)
+        store.directors_hydrated(movie_id)
+        store.is_women_directed(movie_id)
+        store.fetch_movies_for_ids([movie_id, movie_id + 1])
+        store.save_directors(movie_id, {"crew": [{"id": 1, "job": "Director", "name": "x", "gender": 1}]})
+        store.upsert_movie_details({"id": movie_id, "title": "x"})
+        store.bump_catalog_generation()
+
+        tmdb_ingest.enqueue_ids([movie_id, 10**9])
+        for include_failed in (False, True):
+            tmdb_ingest.next_queue_item(include_failed=include_failed, max_attempts=5)
+        tmdb_ingest.update_queue(10**9, "in_progress")
+        tmdb_ingest.mark_failed(10**9, RuntimeError("plan"))
+        tmdb_ingest.set_state("plan", "x")
+        tmdb_ingest.get_state("plan")
+        tmdb_ingest.queue_depth()
+        tmdb_ingest.update_queue(10**9, "done")
+        tmdb_ingest.compact_queue()
+
+        hits = Counter({("browse", "rating:2"): 1, ("poster_size", "w342"): 1})
+        if share:
+            hits[("share", share["token"])] = 1
+        ACCESS_LOG.flush(hits)
+        warming.plan(pages_per_sort=1)
+        warming.poster_sizes()
+        warming.decay_access_stats()
+    finally:
+        # Counts from the requests above; left for the exit flush they would go to the real database.
+        ACCESS_LOG.flush_pending()
+        db.set_query_observer(None)
+        db.DB_PATH = saved_path
+    return captured
+
+
+def explain(conn: sqlite3.Connection, sql: str, params) -> list[str]:
+    if params is None:
+        params = [None] * sql.count("?")
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+
+def problems(sql: str, plan: list[str]) -> list[str]:
+    """Plan lines that are full scans or temp B-tree sorts."""
+    # An index scan feeding ORDER BY ... LIMIT stops after LIMIT rows, so only flag it without LIMIT.
+    limited = " LIMIT " in normalize(sql).upper()
+    out = []
+    for line in plan:
+        if line.startswith("SCAN ") and (" USING " not in line or not limited):
+            out.append(line)
+        elif line.startswith("USE TEMP B-TREE"):
+            out.append(line)
+    return out
+
+
+def existing_indexes(conn: sqlite3.Connection, table: str) -> dict[str, list[str]]:
+    out = {}
+    for idx in conn.execute(f"PRAGMA index_list({table})"):
+        out[idx[1]] = [c[2] for c in conn.execute(f"PRAGMA index_info({idx[1]})")]
+    return out
+
+
+def recommend(conn: sqlite3.Connection, sql: str, plan: list[str]) -> str | None:
+    """Equality columns, then ORDER BY columns, then range columns of the outer table."""
+    text = normalize(sql)
+    m = _FROM.search(text)
+    if not m:
+        return None
+    table, alias = m.group(1), m.group(2)
+
+    if any(line.startswith("SCAN") for line in plan) and any("CORRELATED" in line for line in plan) and "COUNT(" in text:
+        return "rewrite the correlated EXISTS as `tmdb_id IN (SELECT ...)` so the count walks the subquery's index"
+
+    outer = text.split(" EXISTS ", 1)[0]
+    eq, rng = [], []
+    for qual, col, op in _TERM.findall(outer):
+        if qual and alias and qual != alias:
+            continue
+        if col.lower() in ("select", "where", "and", "or", "limit"):
+            continue
+        (eq if op in ("=", "IN", "in") else rng).append(col)
+
+    order = []
+    om = _ORDER.search(text)
+    if om:
+        for part in om.group(1).split(","):
+            ref = part.strip().split()[0]
+            qual, _, col = ref.rpartition(".")
+            if qual and alias and qual != alias:
+                return None  # sort key belongs to a joined table
+            order.append(col)
+
+    cols = []
+    for col in eq + order + rng:
+        if col not in cols:
+            cols.append(col)
+    if not cols:
+        return None
+
+    for name, idx_cols in existing_indexes(conn, table).items():
+        if idx_cols[: len(cols)] == cols:
+            return f"{name} already covers ({', '.join(cols)}); the planner preferred another index"
+    name = "idx_" + table + "_" + "_".join(cols)
+    return f"CREATE INDEX IF NOT EXISTS {name} ON {table}({', '.join(cols)});"
+
+
+def accepted_reason(sql: str, flag: str) -> str | None:
+    text = normalize(sql)
+    for (pattern, line), reason in ACCEPTED.items():
+        if line == flag and pattern in text:
+            return reason
+    return None
+
+
+def scratch_copy(src: Path, dest_dir: Path) -> Path:
+    dest = dest_dir / "plans.sqlite3"
+    with sqlite3.connect(src) as s, sqlite3.connect(dest) as d:
+        s.backup(d)
+    return dest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN QUERY PLAN every catalog query and flag scans/sorts.")
+    parser.add_argument("--db", default=str(db.DB_PATH), help="Populated database to analyze")
+    parser.add_argument("--check", action="store_true", help="Exit 1 if any flagged plan line is not in ACCEPTED")
+    parser.add_argument("--apply", action="store_true", help="Create the recommended indexes in --db")
+    parser.add_argument("--verbose", action="store_true", help="Print plans for unflagged queries too")
+    args = parser.parse_args()
+
+    src = Path(args.db)
+    tmp = Path(tempfile.mkdtemp(prefix="moviebrowser-plans-"))
+    try:
+        scratch = scratch_copy(src, tmp)
+        statements = capture_statements(scratch)
+        conn = sqlite3.connect(scratch)
+
+        unreviewed = 0
+        to_create = []
+        for key, entry in sorted(statements.items(), key=lambda kv: sorted(kv[1]["sources"])):
+            plan = explain(conn, entry["sql"], entry["params"])
+            flags = problems(entry["sql"], plan)
+            if not flags and not args.verbose:
+                continue
+
+            reasons = {flag: accepted_reason(key, flag) for flag in flags}
+            rejected = [flag for flag, reason in reasons.items() if reason is None]
+            status = "ok" if not flags else ("FLAG" if rejected else "accepted")
+            print(f"[{status}] {', '.join(sorted(entry['sources']))}: {key[:160]}")
+            for line in plan:
+                print(f"      {line}")
+                if line in reasons:
+                    print(f"        accepted: {reasons[line]}" if reasons[line] else "        ^ not in ACCEPTED")
+            if rejected:
+                unreviewed += 1
+                rec = recommend(conn, entry["sql"], plan)
+                if rec:
+                    print(f"      recommend: {rec}")
+                    if rec.startswith("CREATE INDEX") and rec not in to_create:
+                        to_create.append(rec)
+            print()
+        conn.close()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"{len(statements)} statements, {unreviewed} unreviewed flag(s).")
+    if to_create:
+        print("Add to schema.sql:")
+        for stmt in to_create:
+            print(f"  {stmt}")
+
+    if args.apply and to_create:
+        with sqlite3.connect(src) as conn:
+            for stmt in to_create:
+                conn.execute(stmt)
+        print(f"Created {len(to_create)} index(es) in {src}.")
+
+    if args.check and unreviewed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
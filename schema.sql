@@ -48,6 +48,62 @@ CREATE TABLE IF NOT EXISTS ingest_queue (
   added_at        TEXT NOT NULL
 );
 
+-- Per-director aggregates over cached movies, kept current by store.refresh_director_stats
+-- whenever credits or movie details are written, so director pages never aggregate per request.
+CREATE TABLE IF NOT EXISTS director_stats (
+  tmdb_person_id  INTEGER PRIMARY KEY,
+  name            TEXT NOT NULL,
+  gender          INTEGER NOT NULL,
+  film_count      INTEGER NOT NULL,  -- credited movies present in movies
+  rated_count     INTEGER NOT NULL,  -- of those, with at least one vote
+  avg_rating      REAL,              -- mean vote_avg over rated films
+  first_year      INTEGER,
+  last_year       INTEGER,
+  updated_at      TEXT NOT NULL
+);
+
+-- Women-directed movie counts per (year, runtime bucket, rating band, vote level), rebuilt by
+-- store.bump_catalog_generation; browse facet counts without the snapshot sum these cells.
+CREATE TABLE IF NOT EXISTS facet_cube (
+  year            INTEGER,
+  runtime         TEXT,              -- facets.RUNTIME_BUCKETS key
+  rating          TEXT,              -- facets.RATING_BANDS key
+  votes           INTEGER NOT NULL,  -- highest facets.VOTE_THRESHOLDS value reached, else 0
+  n               INTEGER NOT NULL
+);
+
+-- Precomputed "more like this" neighbours (similar.py); the movie page reads one PK range.
+CREATE TABLE IF NOT EXISTS similar_movies (
+  tmdb_id         INTEGER NOT NULL,
+  rank            INTEGER NOT NULL,
+  similar_id      INTEGER NOT NULL,
+  score           REAL NOT NULL,      -- cosine similarity of title + overview TF-IDF
+  PRIMARY KEY (tmdb_id, rank)
+);
+
+-- Text fingerprint per scored movie, so a run only scores new or edited movies.
+CREATE TABLE IF NOT EXISTS similar_indexed (
+  tmdb_id         INTEGER PRIMARY KEY,
+  text_hash       TEXT NOT NULL,
+  indexed_at      TEXT NOT NULL
+);
+
+-- Request counts flushed by the web app for the poster warmer (warming.py); halved after each warm run.
+CREATE TABLE IF NOT EXISTS access_stats (
+  kind            TEXT NOT NULL,  -- browse, share, poster_size
+  key             TEXT NOT NULL,  -- "sort:page", share token, poster size
+  hits            INTEGER NOT NULL,
+  last_seen       TEXT NOT NULL,
+  PRIMARY KEY (kind, key)
+) WITHOUT ROWID;
+
+-- Done queue rows moved out by compact_queue(). Only consulted by enqueue_ids, so a processed
+-- id is never queued again; failed rows stay in ingest_queue for retries.
+CREATE TABLE IF NOT EXISTS ingest_archive (
+  tmdb_id         INTEGER PRIMARY KEY,
+  archived_at     TEXT NOT NULL
+);
+
 CREATE TABLE IF NOT EXISTS ingest_state (
   key             TEXT PRIMARY KEY,
   value           TEXT NOT NULL
@@ -61,3 +117,18 @@ CREATE INDEX IF NOT EXISTS idx_movies_title ON movies(title);
 CREATE INDEX IF NOT EXISTS idx_cd_person ON credits_director(tmdb_person_id);
 CREATE INDEX IF NOT EXISTS idx_people_gender ON people(gender);
 CREATE INDEX IF NOT EXISTS idx_ingest_status ON ingest_queue(status);
+
+-- Composite indexes from query_plans.py: browse walks (sort key, year) in order with the
+-- year range checked from the index.
+CREATE INDEX IF NOT EXISTS idx_movies_popularity_year ON movies(popularity, year);
+CREATE INDEX IF NOT EXISTS idx_movies_vote_avg_year ON movies(vote_avg, year);
+CREATE INDEX IF NOT EXISTS idx_movies_vote_count_year ON movies(vote_count, year);
+
+-- Claimable rows only: next_queue_item reads pending (and failed) in added_at order and never
+-- touches done rows. Replaces idx_ingest_queue_status_added_at_attempts, which indexed the whole history.
+DROP INDEX IF EXISTS idx_ingest_queue_status_added_at_attempts;
+CREATE INDEX IF NOT EXISTS idx_ingest_queue_claimable ON ingest_queue(status, added_at, attempts) WHERE status IN ('pending','failed');
+
+-- Director index: one ordered walk per sort within a gender.
+CREATE INDEX IF NOT EXISTS idx_director_stats_gender_film_count ON director_stats(gender, film_count, avg_rating);
+CREATE INDEX IF NOT EXISTS idx_director_stats_gender_avg_rating ON director_stats(gender, avg_rating, film_count);
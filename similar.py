@@ -0,0 +1,283 @@
+"""Offline "more like this" neighbours from title + overview text.
+
+Each catalog movie becomes a hashed TF-IDF vector (crc32 buckets, sublinear
+term frequency, title words counted twice, L2-normalised), stored sparsely as
+NumPy index/value arrays with a per-bucket inverted copy, so a movie's cosine
+similarities with the whole catalog only touch movies sharing a bucket with it.
+Only movies that are new or whose text changed since the last run are scored,
+in batches against the whole catalog: their own top-K is written, and existing
+movies whose K-th neighbour is beaten by a new movie get it merged in. Movies
+that left the catalog are dropped, and lists that pointed at them or at a
+changed movie are rescored. Everything is rescored only with full=True.
+
+    python tmdb_ingest.py --mode similar [--full]
+"""
+import math
+import re
+import time
+import zlib
+from array import array
+
+from db import connect
+from tmdb import now_iso
+
+TOP_K = 12
+DIMS = 1 << 16  # hash buckets; memory follows the words per movie, not DIMS
+BATCH = 64  # rows scored together; their dense scores take BATCH x N x 8 bytes
+BATCH_WORK = 4_000_000  # (entry, matching row) products per batch, ~100 MB of temporaries
+TITLE_WEIGHT = 2
+
+_WORD = re.compile(r"[a-z][a-z']{2,}")
+STOPWORDS = frozenset(
+    """
+    the and for with that this from into their they them his her hers him she who whom
+    are was were been being has have had not but all any can will would about after
+    before when where while what which one two new its it's out over under than then
+    there these those also more most some such only own same very just each other
+    """.split()
+)
+
+
+def tokens(text: str | None) -> list[str]:
+    return [w for w in _WORD.findall((text or "").lower()) if w not in STOPWORDS]
+
+
+def text_hash(title: str | None, overview: str | None) -> str:
+    text = (title or "") + "\n" + (overview or "")
+    return f"{zlib.crc32(text.encode('utf-8')):08x}"
+
+
+def _bucket_counts(title: str | None, overview: str | None) -> dict[int, float]:
+    counts: dict[int, float] = {}
+    for weight, words in ((TITLE_WEIGHT, tokens(title)), (1, tokens(overview))):
+        for w in words:
+            b = zlib.crc32(w.encode("utf-8")) % DIMS
+            counts[b] = counts.get(b, 0.0) + weight
+    return counts
+
+
+class TfIdf:
+    """L2-normalised TF-IDF rows in CSR form plus the same entries grouped by bucket."""
+
+    def __init__(self, indptr, indices, tf):
+        import numpy as np
+
+        self.n = len(indptr) - 1
+        self.indptr, self.indices = indptr, indices
+        # IDF from the whole catalog each run; it is one pass over the entries, not N x N.
+        self.df = np.bincount(indices, minlength=DIMS)
+        idf = (np.log((self.n + 1) / (self.df + 1)) + 1.0).astype(np.float32)
+        row_of = np.repeat(np.arange(self.n, dtype=np.int32), np.diff(indptr))
+        data = (1.0 + np.log(tf)) * idf[indices]
+        norms = np.sqrt(np.bincount(row_of, weights=data * data, minlength=self.n)).astype(np.float32)
+        data /= norms[row_of]  # every entry is > 0, so a row with entries has a non-zero norm
+        self.data = data
+
+        order = np.argsort(indices, kind="stable")
+        self.col_ptr = np.concatenate(([0], np.cumsum(self.df)))
+        self.col_rows = row_of[order]
+        self.col_vals = data[order]
+
+    def work(self, pos: int) -> int:
+        """Products scores() computes for row pos: the entries of every bucket it uses."""
+        return int(self.df[self.indices[self.indptr[pos] : self.indptr[pos + 1]]].sum())
+
+    def scores(self, chunk):
+        """Dense (len(chunk), N) cosine similarities of the chunk's rows with every row."""
+        import numpy as np
+
+        sizes = self.indptr[chunk + 1] - self.indptr[chunk]
+        entries = np.repeat(self.indptr[chunk] - np.cumsum(sizes) + sizes, sizes) + np.arange(sizes.sum())
+        rows = np.repeat(np.arange(len(chunk)), sizes)
+        buckets, values = self.indices[entries], self.data[entries]
+
+        # Expand each entry into its bucket's (row, value) list and add up products per (chunk row, row).
+        lengths = self.df[buckets]
+        hits = np.repeat(self.col_ptr[buckets] - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        keys = np.repeat(rows, lengths) * self.n + self.col_rows[hits]
+        products = np.repeat(values, lengths) * self.col_vals[hits]
+        return np.bincount(keys, products, minlength=len(chunk) * self.n).astype(np.float32).reshape(len(chunk), self.n)
+
+
+def build_matrix(rows):
+    """(ids, TfIdf) for rows of (tmdb_id, title, overview)."""
+    import numpy as np
+
+    ids = np.fromiter((r["tmdb_id"] for r in rows), dtype=np.int64, count=len(rows))
+    indptr, indices, tf = array("q", [0]), array("i"), array("f")
+    for r in rows:
+        counts = _bucket_counts(r["title"], r["overview"])
+        indices.extend(counts.keys())
+        tf.extend(counts.values())
+        indptr.append(len(indices))
+    return ids, TfIdf(
+        np.frombuffer(indptr, dtype=np.int64),
+        np.frombuffer(indices, dtype=np.int32),
+        np.frombuffer(tf, dtype=np.float32),
+    )
+
+
+def _batches(matrix: TfIdf, positions, batch: int, work: int):
+    """positions split into arrays of at most batch rows and about work products each."""
+    import numpy as np
+
+    chunk, total = [], 0
+    for pos in positions:
+        cost = matrix.work(pos)
+        if chunk and (len(chunk) >= batch or total + cost > work):
+            yield np.array(chunk, dtype=np.int64)
+            chunk, total = [], 0
+        chunk.append(pos)
+        total += cost
+    if chunk:
+        yield np.array(chunk, dtype=np.int64)
+
+
+def _top_k(scores, k: int):
+    """Column indexes of the k best scores per row, best first."""
+    import numpy as np
+
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, part, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(part, order, axis=1)
+
+
+def load_catalog():
+    from store import WOMEN_DIRECTED
+
+    with connect() as conn:
+        return conn.execute(
+            f"""
+            SELECT m.tmdb_id, m.title, m.overview
+            FROM movies m
+            WHERE m.tmdb_id IN ({WOMEN_DIRECTED})
+            ORDER BY m.tmdb_id
+            """
+        ).fetchall()
+
+
+def prune_neighbours(catalog: set[int], changed: set[int]) -> set[int]:
+    """Drop the lists of movies no longer in the catalog, and neighbour rows naming those
+    or a movie in changed (its old text's scores are no longer true).
+
+    Returns the remaining movies that lost a neighbour, to be rescored.
+    """
+    with connect() as conn:
+        indexed = {r["tmdb_id"] for r in conn.execute("SELECT tmdb_id FROM similar_indexed")}
+        removed = indexed - catalog
+        conn.executemany("DELETE FROM similar_movies WHERE tmdb_id=?", [(t,) for t in removed])
+        conn.executemany("DELETE FROM similar_indexed WHERE tmdb_id=?", [(t,) for t in removed])
+        gone = removed | (changed & indexed)  # never-indexed movies are in nobody's list yet
+        if not gone:
+            return set()
+        conn.execute("CREATE TEMP TABLE gone_movies (tmdb_id INTEGER PRIMARY KEY)")
+        conn.executemany("INSERT INTO gone_movies (tmdb_id) VALUES (?)", [(t,) for t in gone])
+        lost = {
+            r["tmdb_id"]
+            for r in conn.execute("SELECT tmdb_id FROM similar_movies WHERE similar_id IN (SELECT tmdb_id FROM gone_movies)")
+        }
+        conn.execute("DELETE FROM similar_movies WHERE similar_id IN (SELECT tmdb_id FROM gone_movies)")
+        conn.execute("DROP TABLE gone_movies")
+    return lost
+
+
+def stale_ids(rows, full: bool) -> set[int]:
+    """Catalog movies never indexed or whose title/overview changed since."""
+    if full:
+        return {r["tmdb_id"] for r in rows}
+    with connect() as conn:
+        indexed = {r["tmdb_id"]: r["text_hash"] for r in conn.execute("SELECT tmdb_id, text_hash FROM similar_indexed")}
+    return {r["tmdb_id"] for r in rows if indexed.get(r["tmdb_id"]) != text_hash(r["title"], r["overview"])}
+
+
+def _current_floor(conn, n: int, positions: dict[int, int], k: int):
+    """Per catalog row, the score a new neighbour must beat (-inf while a list has fewer than k)."""
+    import numpy as np
+
+    floor = np.full(n, -np.inf, dtype=np.float32)
+    for r in conn.execute("SELECT tmdb_id, COUNT(*) AS n, MIN(score) AS low FROM similar_movies GROUP BY tmdb_id"):
+        pos = positions.get(r["tmdb_id"])
+        if pos is not None and r["n"] >= k:
+            floor[pos] = r["low"]
+    return floor
+
+
+def update_similar(full: bool = False, k: int = TOP_K, batch: int = BATCH, work: int = BATCH_WORK) -> dict:
+    """Score new/changed movies against the catalog and merge them into similar_movies."""
+    import numpy as np
+
+    started = time.perf_counter()
+    rows = load_catalog()
+    catalog = {r["tmdb_id"] for r in rows}
+    stale = stale_ids(rows, full)
+    # A full run rewrites every list anyway; only drop the lists of removed movies.
+    stale |= prune_neighbours(catalog, set() if full else stale) & catalog
+    result = {"catalog": len(rows), "scored": len(stale), "merged": 0}
+    if not stale or len(rows) < 2:
+        result["seconds"] = time.perf_counter() - started
+        return result
+
+    ids, matrix = build_matrix(rows)
+    positions = {int(tmdb_id): i for i, tmdb_id in enumerate(ids)}
+    stale_pos = np.array(sorted(positions[t] for t in stale), dtype=np.int64)
+    hashes = {r["tmdb_id"]: text_hash(r["title"], r["overview"]) for r in rows}
+
+    with connect() as conn:
+        if full:
+            conn.execute("DELETE FROM similar_movies")
+            floor = np.full(len(ids), np.inf, dtype=np.float32)  # every list is rewritten below
+        else:
+            floor = _current_floor(conn, len(ids), positions, k)
+        is_stale = np.zeros(len(ids), dtype=bool)
+        is_stale[stale_pos] = True
+        candidates: dict[int, list[tuple[float, int]]] = {}
+
+        for chunk in _batches(matrix, stale_pos, batch, work):
+            scores = matrix.scores(chunk)  # (batch, N) cosine similarities
+            scores[np.arange(len(chunk)), chunk] = -np.inf  # never your own neighbour
+
+            best = _top_k(scores, k)
+            out = []
+            for row, pos in enumerate(chunk):
+                tmdb_id = int(ids[pos])
+                for rank, col in enumerate(best[row]):
+                    if np.isfinite(scores[row, col]) and scores[row, col] > 0:
+                        out.append((tmdb_id, rank, int(ids[col]), float(scores[row, col])))
+            conn.executemany("DELETE FROM similar_movies WHERE tmdb_id=?", [(int(ids[p]),) for p in chunk])
+            conn.executemany("INSERT INTO similar_movies (tmdb_id,rank,similar_id,score) VALUES (?,?,?,?)", out)
+
+            # Existing (non-stale) movies for which a movie in this batch beats their current k-th neighbour.
+            beats = (scores > floor[None, :]) & ~is_stale[None, :] & (scores > 0)
+            for row, col in zip(*np.nonzero(beats)):
+                candidates.setdefault(int(ids[col]), []).append((float(scores[row, col]), int(ids[chunk[row]])))
+
+        result["merged"] = _merge_candidates(conn, candidates, k)
+        conn.executemany(
+            """
+            INSERT INTO similar_indexed (tmdb_id, text_hash, indexed_at) VALUES (?,?,?)
+            ON CONFLICT(tmdb_id) DO UPDATE SET text_hash=excluded.text_hash, indexed_at=excluded.indexed_at
+            """,
+            [(t, hashes[t], now_iso()) for t in stale],
+        )
+
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def _merge_candidates(conn, candidates: dict[int, list[tuple[float, int]]], k: int) -> int:
+    """Fold new neighbours into existing top-k lists; returns how many lists changed."""
+    for tmdb_id, new in candidates.items():
+        current = conn.execute("SELECT similar_id, score FROM similar_movies WHERE tmdb_id=?", (tmdb_id,)).fetchall()
+        merged = {r["similar_id"]: r["score"] for r in current}
+        for score, similar_id in new:
+            merged[similar_id] = max(score, merged.get(similar_id, -math.inf))
+        top = sorted(merged.items(), key=lambda kv: -kv[1])[:k]
+        conn.execute("DELETE FROM similar_movies WHERE tmdb_id=?", (tmdb_id,))
+        conn.executemany(
+            "INSERT INTO similar_movies (tmdb_id,rank,similar_id,score) VALUES (?,?,?,?)",
+            [(tmdb_id, rank, similar_id, score) for rank, (similar_id, score) in enumerate(top)],
+        )
+    return len(candidates)
@@ -0,0 +1,214 @@
+"""Render the anonymous, database-only pages into a static tree for nginx.
+
+Browse pages (every sort x page, plots on/off, no filters), movie pages,
+director pages, the director index, share pages, cached posters and static/
+are written under --out; HTML and CSS get .gz (and .br) siblings for nginx's
+gzip_static. Pages render in a process pool through the Flask test client; a
+file is only rewritten when its content hash changed since the last export,
+and files the previous export wrote that are no longer produced are removed.
+Filtered browse, the basket and every POST still go to Flask; see
+deployment/nginx-static.conf.
+
+    python tmdb_ingest.py --mode export-static --out /var/www/moviebrowser
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from compression import PAGE, SUFFIXES, write_precompressed
+from db import connect, connect_catalog
+
+MANIFEST = ".export-manifest.json"
+BROWSE_SORTS = ("popularity", "rating", "votes", "year")
+BROWSE_PAGE_SIZE = 20
+DIRECTORS_PAGE_SIZE = 50
+CHUNK = 200  # pages per pool task
+PRECOMPRESS = (".html", ".css", ".js", ".svg")  # written with .gz/.br siblings for gzip_static
+
+_client = None
+_out: Path | None = None
+_previous: dict[str, str] = {}
+
+
+def file_for(url: str) -> str:
+    """Relative file for a URL: {path}/index[.{query}].html, matching the nginx try_files rule."""
+    path, _, query = url.partition("?")
+    name = f"index.{query}.html" if query else "index.html"
+    return (path.strip("/") + "/" + name).lstrip("/")
+
+
+def _precompressed(dest: Path) -> bool:
+    return not dest.name.endswith(PRECOMPRESS) or dest.with_name(dest.name + SUFFIXES["gzip"]).exists()
+
+
+def write_if_changed(out: Path, rel: str, body: bytes, previous: dict[str, str]) -> tuple[str, bool]:
+    digest = hashlib.sha256(body).hexdigest()
+    dest = out / rel
+    if previous.get(rel) == digest and dest.exists() and _precompressed(dest):
+        return digest, False
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(dest.name + ".tmp")
+    tmp.write_bytes(body)
+    os.replace(tmp, dest)
+    if dest.name.endswith(PRECOMPRESS):
+        write_precompressed(dest, PAGE)
+    return digest, True
+
+
+def _init_worker(out: str, previous: dict[str, str]):
+    global _client, _out, _previous
+    import app as app_module
+
+    app_module.CATALOG_SNAPSHOT = True  # deep browse pages without OFFSET scans
+    app_module.app.config["STATIC_EXPORT"] = True
+    _client = app_module.app.test_client()
+    _out = Path(out)
+    _previous = previous
+
+
+def _render_chunk(pages: list[tuple[str, list[str]]]) -> list[tuple[str, str | None, bool]]:
+    """Render each URL once and write it under every alias URL's file: [(rel, digest or None, wrote)]."""
+    results = []
+    for url, aliases in pages:
+        r = _client.get(url)
+        for alias in [url] + aliases:
+            rel = file_for(alias)
+            if r.status_code != 200:
+                results.append((rel, None, False))
+                continue
+            digest, wrote = write_if_changed(_out, rel, r.get_data(), _previous)
+            results.append((rel, digest, wrote))
+    return results
+
+
+def browse_pages(app, total: int) -> list[tuple[str, list[str]]]:
+    """Unfiltered browse pages under every URL form the templates link to."""
+    from flask import url_for
+
+    pages = []
+    last = max(1, -(-total // BROWSE_PAGE_SIZE))
+    with app.test_request_context():
+        for sort in BROWSE_SORTS:
+            for plots in ("0", "1"):
+                for page in range(1, last + 1):
+                    base = dict(q="", sort=sort, year_min="", year_max="")
+                    # page_url() (prev/next) and toggle_plots_url order their arguments differently.
+                    canonical = url_for("browse", **base, plots=plots, page=page)
+                    aliases = [url_for("browse", **base, page=page, plots=plots)]
+                    if page == 1 and plots == "0":
+                        # The search form's GET submission and the header link.
+                        aliases.append(url_for("browse", q="", year_min="", year_max="", sort=sort))
+                        if sort == "popularity":
+                            aliases.append(url_for("browse"))
+                    pages.append((canonical, [a for a in aliases if a != canonical]))
+    return pages
+
+
+def catalog_pages(app) -> list[tuple[str, list[str]]]:
+    from flask import url_for
+
+    import catalog
+    from store import list_directors
+
+    snapshot = catalog.current()
+    with connect_catalog() as conn:
+        movies = [r[0] for r in conn.execute("SELECT tmdb_id FROM movies")]
+        directors = [r[0] for r in conn.execute("SELECT tmdb_person_id FROM director_stats")]
+    with connect() as conn:
+        tokens = [r[0] for r in conn.execute("SELECT token FROM shared_sets")]
+
+    pages = browse_pages(app, len(snapshot))
+    with app.test_request_context():
+        pages += [(url_for("movie", tmdb_id=tmdb_id), []) for tmdb_id in movies]
+        pages += [(url_for("director", person_id=pid), []) for pid in directors]
+        for sort in ("films", "rating"):
+            total, _ = list_directors(sort=sort, limit=0)
+            for page in range(1, max(1, -(-total // DIRECTORS_PAGE_SIZE)) + 1):
+                aliases = [url_for("directors", sort=sort)] if page == 1 else []
+                if page == 1 and sort == "films":
+                    aliases.append(url_for("directors"))
+                pages.append((url_for("directors", sort=sort, page=page), aliases))
+        for token in tokens:
+            pages.append((url_for("share_view", token=token), []))
+            for plots in ("0", "1"):
+                pages.append((url_for("share_view", token=token, plots=plots), []))
+    return pages
+
+
+def copy_assets(out: Path, previous: dict[str, str]) -> tuple[dict[str, str], int]:
+    """Static files and cached posters, copied when size/mtime changed."""
+    import store
+
+    manifest, copied = {}, 0
+    sources = [(p, "static/" + p.relative_to("static").as_posix()) for p in Path("static").rglob("*") if p.is_file()]
+    for p in store.CACHE_DIR.glob("*_*.jpg"):
+        tmdb_id, _, size = p.stem.rpartition("_")
+        if tmdb_id.isdigit():
+            sources.append((p, f"img/poster/{size}/{tmdb_id}.jpg"))
+
+    for src, rel in sources:
+        st = src.stat()
+        stamp = f"{st.st_size}:{st.st_mtime_ns}"
+        manifest[rel] = stamp
+        dest = out / rel
+        if previous.get(rel) == stamp and dest.exists() and _precompressed(dest):
+            continue
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(src, dest)
+        if dest.name.endswith(PRECOMPRESS):
+            write_precompressed(dest)
+        copied += 1
+    return manifest, copied
+
+
+def export_static(out: str, workers: int | None = None) -> dict:
+    """Export the static tree into out; returns counts of pages written/unchanged, assets copied, files removed."""
+    from app import app
+
+    out_dir = Path(out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = out_dir / MANIFEST
+    previous = json.loads(manifest_path.read_text(encoding="utf-8")) if manifest_path.exists() else {}
+
+    started = time.perf_counter()
+    pages = catalog_pages(app)
+    chunks = [pages[i : i + CHUNK] for i in range(0, len(pages), CHUNK)]
+
+    manifest: dict[str, str] = {}
+    written = unchanged = failed = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(str(out_dir), previous)) as pool:
+        for results in pool.map(_render_chunk, chunks):
+            for rel, digest, wrote in results:
+                if digest is None:
+                    failed += 1
+                    continue
+                manifest[rel] = digest
+                written += wrote
+                unchanged += not wrote
+
+    assets, copied = copy_assets(out_dir, previous)
+    manifest.update(assets)
+
+    removed = 0
+    for rel in previous.keys() - manifest.keys():
+        for suffix in ("", *SUFFIXES.values()):
+            (out_dir / (rel + suffix)).unlink(missing_ok=True)
+        removed += 1
+
+    tmp = manifest_path.with_name(MANIFEST + ".tmp")
+    tmp.write_text(json.dumps(manifest, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, manifest_path)
+
+    return {
+        "pages": len(pages),
+        "written": written,
+        "unchanged": unchanged,
+        "failed": failed,
+        "assets_copied": copied,
+        "removed": removed,
+        "seconds": time.perf_counter() - started,
+    }
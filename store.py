@@ -1,33 +1,73 @@
 from pathlib import Path
-from db import connect
+from db import connect, connect_catalog
+from facets import (
+    COLUMN_FACETS,
+    DIRECTOR_OPTIONS,
+    RATING_BANDS,
+    RUNTIME_BUCKETS,
+    bucket_sql,
+    cube_counts,
+    narrow_years,
+    sql_terms as facet_terms,
+    votes_level_sql,
+)
 from tmdb import now_iso
 
 CACHE_DIR = Path("cache/posters")
 CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
 
+_image_session = None
+
+
+def image_session():
+    """Shared requests.Session for the image CDN so poster fetches reuse connections."""
+    global _image_session
+    if _image_session is None:
+        import requests
+        _image_session = requests.Session()
+    return _image_session
+
+
+def poster_cache_path(tmdb_id: int, size: str) -> Path:
+    return CACHE_DIR / f"{tmdb_id}_{size}.jpg"
+
+
+def poster_path_for(tmdb_id: int, published: bool = False) -> str | None:
+    """published=True reads what the web app serves; ingest reads the working DB it just wrote."""
+    with (connect_catalog() if published else connect()) as conn:
+        row = conn.execute("SELECT poster_path FROM movies WHERE tmdb_id=?", (tmdb_id,)).fetchone()
+    return row["poster_path"] if row else None
+
+
+def download_poster(url: str, cache_path: Path) -> None:
+    """Stream a poster into the cache via a temp file so readers never see a partial image."""
+    tmp = cache_path.with_name(cache_path.name + ".part")
+    try:
+        with image_session().get(url, stream=True, timeout=20) as r:
+            r.raise_for_status()
+            with open(tmp, "wb") as f:
+                for chunk in r.iter_content(chunk_size=1024 * 64):
+                    if chunk:
+                        f.write(chunk)
+        tmp.replace(cache_path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
 def prefetch_poster(tmdb, tmdb_id: int, size: str = "w342") -> bool:
     """Download and cache a poster if not already cached. Returns True if downloaded."""
-    with connect() as conn:
-        row = conn.execute("SELECT poster_path FROM movies WHERE tmdb_id=?", (tmdb_id,)).fetchone()
-    if not row or not row["poster_path"]:
+    poster_path = poster_path_for(tmdb_id)
+    if not poster_path:
         return False
 
-    poster_path = row["poster_path"]
-    cache_path = CACHE_DIR / f"{tmdb_id}_{size}.jpg"
-
+    cache_path = poster_cache_path(tmdb_id, size)
     if cache_path.exists():
         return False
 
     try:
-        import requests
-        url = tmdb.poster_url(poster_path, size=size)
-        r = requests.get(url, stream=True, timeout=20)
-        r.raise_for_status()
-        with open(cache_path, "wb") as f:
-            for chunk in r.iter_content(chunk_size=1024 * 64):
-                if chunk:
-                    f.write(chunk)
+        download_poster(tmdb.poster_url(poster_path, size=size), cache_path)
         return True
     except Exception:
         return False
@@ -69,6 +109,7 @@ def upsert_movie_from_tmdb_payload(m: dict):
                 now_iso(),
             ),
         )
+        refresh_movie_directors(conn, m["id"])
 
 
 def upsert_movie_details(details: dict):
@@ -108,6 +149,7 @@ def upsert_movie_details(details: dict):
                 now_iso(),
             ),
         )
+        refresh_movie_directors(conn, details["id"])
 
 
 def hydrate_movie_details(tmdb, tmdb_id: int):
@@ -116,7 +158,10 @@ def hydrate_movie_details(tmdb, tmdb_id: int):
 
 
 def hydrate_directors(tmdb, tmdb_id: int):
-    credits = tmdb.movie_credits(tmdb_id)
+    save_directors(tmdb_id, tmdb.movie_credits(tmdb_id))
+
+
+def save_directors(tmdb_id: int, credits: dict):
     crew = credits.get("crew") or []
     directors = [c for c in crew if c.get("job") == "Director" and c.get("id")]
 
@@ -140,6 +185,121 @@ def hydrate_directors(tmdb, tmdb_id: int):
                 """,
                 (tmdb_id, d["id"]),
             )
+        refresh_director_stats(conn, [d["id"] for d in directors])
+
+
+# Aggregate over cached movies only; the join drops directors with nothing cached yet.
+_DIRECTOR_STATS_INSERT = """
+    INSERT INTO director_stats
+      (tmdb_person_id,name,gender,film_count,rated_count,avg_rating,first_year,last_year,updated_at)
+    SELECT p.tmdb_person_id, p.name, p.gender,
+           COUNT(m.tmdb_id),
+           COUNT(CASE WHEN m.vote_count > 0 THEN m.vote_avg END),
+           AVG(CASE WHEN m.vote_count > 0 THEN m.vote_avg END),
+           MIN(m.year), MAX(m.year), ?
+    FROM people p
+    JOIN credits_director cd ON cd.tmdb_person_id = p.tmdb_person_id
+    JOIN movies m ON m.tmdb_id = cd.tmdb_id
+    WHERE {where}
+    GROUP BY p.tmdb_person_id
+"""
+
+
+def refresh_director_stats(conn, person_ids) -> None:
+    """Recompute director_stats for these directors; each reads one filmography via idx_cd_person."""
+    conn.executemany(
+        _DIRECTOR_STATS_INSERT.format(where="p.tmdb_person_id = ?")
+        + """
+        ON CONFLICT(tmdb_person_id) DO UPDATE SET
+          name=excluded.name,
+          gender=excluded.gender,
+          film_count=excluded.film_count,
+          rated_count=excluded.rated_count,
+          avg_rating=excluded.avg_rating,
+          first_year=excluded.first_year,
+          last_year=excluded.last_year,
+          updated_at=excluded.updated_at
+        """,
+        [(now_iso(), pid) for pid in set(person_ids)],
+    )
+
+
+def refresh_movie_directors(conn, tmdb_id: int) -> None:
+    rows = conn.execute("SELECT tmdb_person_id FROM credits_director WHERE tmdb_id=?", (tmdb_id,)).fetchall()
+    if rows:
+        refresh_director_stats(conn, [r["tmdb_person_id"] for r in rows])
+
+
+def rebuild_director_stats() -> int:
+    """Backfill every director in one pass; returns the number of rows written."""
+    with connect() as conn:
+        conn.execute("DELETE FROM director_stats")
+        conn.execute(_DIRECTOR_STATS_INSERT.format(where="1=1"), (now_iso(),))
+        return conn.execute("SELECT COUNT(*) FROM director_stats").fetchone()[0]
+
+
+def director_stats(person_id: int):
+    with connect_catalog() as conn:
+        return conn.execute("SELECT * FROM director_stats WHERE tmdb_person_id=?", (person_id,)).fetchone()
+
+
+def similar_for(tmdb_id: int, limit: int = 8):
+    """Precomputed neighbours from similar.py, best first."""
+    with connect_catalog() as conn:
+        return conn.execute(
+            """
+            SELECT m.*
+            FROM similar_movies s
+            JOIN movies m ON m.tmdb_id = s.similar_id
+            WHERE s.tmdb_id = ?
+            ORDER BY s.rank
+            LIMIT ?
+            """,
+            (tmdb_id, limit),
+        ).fetchall()
+
+
+def director_filmography(person_id: int):
+    with connect_catalog() as conn:
+        return conn.execute(
+            """
+            SELECT m.*
+            FROM credits_director cd
+            JOIN movies m ON m.tmdb_id = cd.tmdb_id
+            WHERE cd.tmdb_person_id = ?
+            ORDER BY m.year DESC NULLS LAST, m.title
+            """,
+            (person_id,),
+        ).fetchall()
+
+
+DIRECTOR_MIN_RATED = 2  # rated films needed to appear in the by-rating index
+
+
+def list_directors(sort: str = "films", offset: int = 0, limit: int = 50):
+    """Women directors from director_stats by film count or average rating: (total, rows)."""
+    if sort == "rating":
+        where = "gender = 1 AND rated_count >= ?"
+        params = [DIRECTOR_MIN_RATED]
+        order = "avg_rating DESC, film_count DESC"
+    else:
+        where = "gender = 1"
+        params = []
+        order = "film_count DESC, avg_rating DESC"
+
+    with connect_catalog() as conn:
+        total = conn.execute(f"SELECT COUNT(*) FROM director_stats WHERE {where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"""
+            SELECT *
+            FROM director_stats
+            WHERE {where}
+            ORDER BY {order}
+            LIMIT ? OFFSET ?
+            """,
+            params + [limit, offset],
+        ).fetchall()
+    return total, rows
 
 
 def directors_hydrated(tmdb_id: int) -> bool:
@@ -167,11 +327,218 @@ def is_women_directed(tmdb_id: int) -> bool:
     return row is not None
 
 
+# Ids of movies with at least one woman director: the catalog.
+WOMEN_DIRECTED = """
+  SELECT cd.tmdb_id
+  FROM credits_director cd
+  JOIN people p ON p.tmdb_person_id = cd.tmdb_person_id
+  WHERE p.gender = 1
+"""
+
+
+def browse_movies(
+    q: str = "",
+    year_min: int | None = None,
+    year_max: int | None = None,
+    sort: str = "popularity",
+    offset: int = 0,
+    limit: int = 20,
+    facets: dict | None = None,
+):
+    """Women-directed movies for one browse page: (total matching, rows)."""
+    facets = facets or {}
+    year_min, year_max = narrow_years(year_min, year_max, facets.get("decade"))
+    filters = []
+    params = []
+
+    if q:
+        filters.append("m.title LIKE ?")
+        params.append(f"%{q}%")
+
+    if year_min is not None:
+        filters.append("m.year >= ?")
+        params.append(year_min)
+    if year_max is not None:
+        filters.append("m.year <= ?")
+        params.append(year_max)
+
+    facet_filters, facet_params = facet_terms(facets)
+    filters += facet_filters
+    params += facet_params
+
+    women_directed = """
+      EXISTS (
+        SELECT 1
+        FROM credits_director cd
+        JOIN people p ON p.tmdb_person_id = cd.tmdb_person_id
+        WHERE cd.tmdb_id = m.tmdb_id
+          AND p.gender = 1
+      )
+    """
+
+    # Non-year sorts walk the (sort key, year) index and check year from the index entry;
+    # unary + keeps the planner from picking idx_movies_year and sorting the whole range.
+    page_filters = filters if sort == "year" else [f.replace("m.year", "+m.year") for f in filters]
+    page_where = ["1=1"] + page_filters + [women_directed]
+
+    # An unfiltered count starts from women directors (idx_people_gender, idx_cd_person)
+    # instead of probing every movie; filtered counts let the year range or title drive.
+    count_where = ["1=1"] + filters + [women_directed if filters else f"m.tmdb_id IN ({WOMEN_DIRECTED})"]
+
+    order = {
+        "popularity": "m.popularity DESC NULLS LAST",
+        "rating": "m.vote_avg DESC NULLS LAST",
+        "votes": "m.vote_count DESC NULLS LAST",
+        "year": "m.year DESC NULLS LAST",
+    }.get(sort, "m.popularity DESC NULLS LAST")
+
+    with connect_catalog() as conn:
+        total_count = conn.execute(
+            f"""
+            SELECT COUNT(*)
+            FROM movies m
+            WHERE {" AND ".join(count_where)}
+            """,
+            params,
+        ).fetchone()[0]
+        movies = conn.execute(
+            f"""
+            SELECT m.*
+            FROM movies m
+            WHERE {" AND ".join(page_where)}
+            ORDER BY {order}
+            LIMIT ? OFFSET ?
+            """,
+            params + [limit, offset],
+        ).fetchall()
+
+    return total_count, movies
+
+
+def catalog_generation() -> str:
+    """Changes whenever ingest has written new catalog data; readers use it to drop cached views."""
+    with connect_catalog() as conn:
+        row = conn.execute("SELECT value FROM ingest_state WHERE key='catalog_generation'").fetchone()
+    return row["value"] if row else "0"
+
+
+_CUBE_COLUMNS = f"""
+    m.year,
+    {bucket_sql("m.runtime", RUNTIME_BUCKETS)},
+    {bucket_sql("m.vote_avg", RATING_BANDS)},
+    {votes_level_sql("m.vote_count")}
+"""
+
+def rebuild_facet_cube(conn) -> None:
+    """One GROUP BY over the catalog into facet_cube; a few thousand cells whatever its size."""
+    conn.execute("DELETE FROM facet_cube")
+    conn.execute(
+        f"""
+        INSERT INTO facet_cube (year, runtime, rating, votes, n)
+        SELECT {_CUBE_COLUMNS}, COUNT(*)
+        FROM movies m
+        WHERE m.tmdb_id IN ({WOMEN_DIRECTED})
+        GROUP BY 1, 2, 3, 4
+        """
+    )
+
+
+def bump_catalog_generation() -> None:
+    """Mark the catalog changed and refresh the facet counts derived from it, in one transaction."""
+    with connect() as conn:
+        rebuild_facet_cube(conn)
+        conn.execute(
+            """
+            INSERT INTO ingest_state (key,value) VALUES ('catalog_generation','1')
+            ON CONFLICT(key) DO UPDATE SET value=CAST(value AS INTEGER) + 1
+            """
+        )
+
+
+def facet_counts(q: str = "", year_min: int | None = None, year_max: int | None = None, facets: dict | None = None):
+    """Browse facet counts without the catalog snapshot: (counts, director names).
+
+    Column facets sum facet_cube cells; a title or director filter instead counts the
+    rows it matches, which the browse count query scans anyway. Director options are
+    the women with the most films in director_stats (plus a selected one), each counted
+    over the movies the other filters leave, via idx_cd_person.
+    """
+    selected = facets or {}
+
+    def year_terms(col, lo, hi):
+        terms, params = ["1=1"], []
+        if lo is not None:
+            terms.append(f"{col} >= ?")
+            params.append(lo)
+        if hi is not None:
+            terms.append(f"{col} <= ?")
+            params.append(hi)
+        return terms, params
+
+    with connect_catalog() as conn:
+        if q or "director" in selected:
+            terms, params = year_terms("m.year", year_min, year_max)
+            terms.append(f"m.tmdb_id IN ({WOMEN_DIRECTED})")
+            if q:
+                terms.append("m.title LIKE ?")
+                params.append(f"%{q}%")
+            if "director" in selected:
+                director_terms, director_params = facet_terms({"director": selected["director"]})
+                terms += director_terms
+                params += director_params
+            cells = conn.execute(f"SELECT {_CUBE_COLUMNS}, 1 FROM movies m WHERE {' AND '.join(terms)}", params).fetchall()
+        else:
+            terms, params = year_terms("year", year_min, year_max)
+            cells = conn.execute(
+                f"SELECT year, runtime, rating, votes, n FROM facet_cube WHERE {' AND '.join(terms)}",
+                params,
+            ).fetchall()
+
+        shortlist = conn.execute(
+            """
+            SELECT tmdb_person_id, name
+            FROM director_stats
+            WHERE gender = 1
+            ORDER BY film_count DESC
+            LIMIT ?
+            """,
+            (DIRECTOR_OPTIONS,),
+        ).fetchall()
+        names = {d["tmdb_person_id"]: d["name"] for d in shortlist}
+        if "director" in selected and selected["director"] not in names:
+            row = conn.execute("SELECT name FROM people WHERE tmdb_person_id = ?", (selected["director"],)).fetchone()
+            if row:
+                names[selected["director"]] = row["name"]
+
+        # Shortlisted directors are women, so their films need no women-directed check.
+        terms, params = year_terms("m.year", *narrow_years(year_min, year_max, selected.get("decade")))
+        if q:
+            terms.append("m.title LIKE ?")
+            params.append(f"%{q}%")
+        column_terms, column_params = facet_terms({k: v for k, v in selected.items() if k != "director"})
+        terms += column_terms
+        params += column_params
+        directors = conn.execute(
+            f"""
+            SELECT cd.tmdb_person_id, COUNT(*) AS n
+            FROM credits_director cd
+            JOIN movies m ON m.tmdb_id = cd.tmdb_id
+            WHERE cd.tmdb_person_id IN ({",".join("?" * len(names))}) AND {" AND ".join(terms)}
+            GROUP BY cd.tmdb_person_id
+            """,
+            [*names, *params],
+        ).fetchall()
+
+    counts = cube_counts(cells, {k: v for k, v in selected.items() if k in COLUMN_FACETS})
+    counts["director"] = {d["tmdb_person_id"]: d["n"] for d in directors}
+    return counts, names
+
+
 def fetch_movies_for_ids(ids: list[int]):
     if not ids:
         return []
     placeholders = ",".join(["?"] * len(ids))
-    with connect() as conn:
+    with connect_catalog() as conn:
         rows = conn.execute(
             f"SELECT * FROM movies WHERE tmdb_id IN ({placeholders})",
             ids,
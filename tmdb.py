@@ -2,8 +2,9 @@ import os
 import time
 import requests
 
-TMDB_BASE = "https://api.themoviedb.org/3"
-TMDB_IMG = "https://image.tmdb.org/t/p"
+# Overridable so benchmarks can point the clients at a local fake server.
+TMDB_BASE = os.getenv("TMDB_API_BASE", "https://api.themoviedb.org/3")
+TMDB_IMG = os.getenv("TMDB_IMG_BASE", "https://image.tmdb.org/t/p")
 
 class TMDb:
     def __init__(self, api_key: str | None = None, region: str = "US", language: str = "en-US"):
@@ -0,0 +1,126 @@
+import asyncio
+import os
+from pathlib import Path
+
+import aiohttp
+
+from tmdb import TMDB_BASE, TMDB_IMG
+
+
+class AsyncTMDb:
+    """asyncio TMDb client sharing one pooled, keep-alive connector for the API and image CDN.
+
+    Use as an async context manager so the connector is closed when done.
+    """
+
+    def __init__(
+        self,
+        api_key: str | None = None,
+        region: str = "US",
+        language: str = "en-US",
+        concurrency: int = 8,
+        base_url: str = TMDB_BASE,
+        img_url: str = TMDB_IMG,
+    ):
+        self.api_key = api_key or os.getenv("TMDB_API_KEY")
+        if not self.api_key:
+            raise RuntimeError("TMDB_API_KEY is required")
+        self.region = region
+        self.language = language
+        self.base_url = base_url
+        self.img_url = img_url
+        self.concurrency = max(1, concurrency)
+        self._sem = asyncio.Semaphore(self.concurrency)
+        self.session: aiohttp.ClientSession | None = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency * 2,
+            limit_per_host=self.concurrency,
+            keepalive_timeout=60,
+            ttl_dns_cache=300,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=30, connect=10),
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def _get(self, path: str, **params):
+        url = f"{self.base_url}{path}"
+        params.setdefault("api_key", self.api_key)
+        params.setdefault("language", self.language)
+        async with self._sem:
+            async with self.session.get(url, params=params) as r:
+                r.raise_for_status()
+                return await r.json()
+
+    async def search_movie(self, query: str, page: int = 1):
+        return await self._get("/search/movie", query=query, page=page, include_adult="false", region=self.region)
+
+    async def popular_movies(self, page: int = 1):
+        return await self._get("/movie/popular", page=page, region=self.region)
+
+    async def movie_details(self, tmdb_id: int):
+        return await self._get(f"/movie/{tmdb_id}")
+
+    async def movie_credits(self, tmdb_id: int):
+        return await self._get(f"/movie/{tmdb_id}/credits")
+
+    async def movie_changes(self, start_date: str | None = None, end_date: str | None = None, page: int = 1):
+        params = {"page": page}
+        if start_date:
+            params["start_date"] = start_date
+        if end_date:
+            params["end_date"] = end_date
+        return await self._get("/movie/changes", **params)
+
+    def poster_url(self, poster_path: str, size: str = "w342") -> str:
+        return f"{self.img_url}/{size}{poster_path}"
+
+    async def download(self, url: str, dest: Path, chunk_size: int = 1024 * 64) -> int:
+        """Stream url to dest via a temp file and rename. Returns bytes written."""
+        tmp = dest.with_name(dest.name + ".part")
+        written = 0
+        try:
+            async with self._sem:
+                async with self.session.get(url) as r:
+                    r.raise_for_status()
+                    with open(tmp, "wb") as f:
+                        async for chunk in r.content.iter_chunked(chunk_size):
+                            f.write(chunk)
+                            written += len(chunk)
+            os.replace(tmp, dest)
+        except BaseException:
+            # Failed or cancelled mid-stream: don't leave the partial file in the cache.
+            tmp.unlink(missing_ok=True)
+            raise
+        return written
+
+
+class AsyncRateLimiter:
+    """Async counterpart of tmdb_ingest.RateLimiter; spaces out calls across all tasks."""
+
+    def __init__(self, rate_per_sec: float):
+        self.min_interval = 1.0 / rate_per_sec if rate_per_sec > 0 else 0.0
+        self.next_time = 0.0
+
+    async def wait(self) -> float:
+        if self.min_interval <= 0:
+            return 0.0
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self.next_time)
+        self.next_time = slot + self.min_interval
+        delay = slot - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
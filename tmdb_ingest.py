@@ -1,4 +1,5 @@
 import argparse
+import asyncio
 import gzip
 import json
 import time
@@ -7,34 +8,51 @@ from datetime import date, timedelta
 import requests
 from dotenv import load_dotenv
 
-from db import connect, init_db
+from db import connect, init_db, publish_snapshot, published_path, rollback_snapshot
+from metrics import Registry
 from tmdb import TMDb
+from tmdb_async import AsyncRateLimiter, AsyncTMDb
 from store import (
-    hydrate_directors,
-    hydrate_movie_details,
+    bump_catalog_generation,
     is_women_directed,
+    poster_cache_path,
     prefetch_poster,
+    rebuild_director_stats,
+    save_directors,
+    upsert_movie_details,
 )
 from tmdb import now_iso
 
 
 EXPORT_BASE = "https://files.tmdb.org/p/exports"
+BUMP_INTERVAL = 15 * 60.0  # seconds between catalog generation bumps during a worker run
+
+METRICS = Registry("moviebrowser_ingest")
 
 load_dotenv()
 
 
 class RateLimiter:
     def __init__(self, rate_per_sec: float):
+        self.rate_per_sec = rate_per_sec
         self.min_interval = 1.0 / rate_per_sec if rate_per_sec > 0 else 0.0
         self.next_time = 0.0
 
-    def wait(self):
+    def wait(self) -> float:
         if self.min_interval <= 0:
-            return
+            return 0.0
         now = time.monotonic()
+        waited = 0.0
         if now < self.next_time:
-            time.sleep(self.next_time - now)
+            waited = self.next_time - now
+            time.sleep(waited)
         self.next_time = max(now, self.next_time) + self.min_interval
+        return waited
+
+
+def record_rate_wait(waited: float) -> None:
+    METRICS.inc("rate_wait_seconds_total", waited)
+    METRICS.observe("rate_wait_seconds", waited)
 
 
 def get_state(key: str) -> str | None:
@@ -69,8 +87,16 @@ def enqueue_ids(ids: list[int]) -> int:
                 f"SELECT tmdb_id FROM ingest_queue WHERE tmdb_id IN ({placeholders})",
                 batch,
             ).fetchall()
+            existing_archive = conn.execute(
+                f"SELECT tmdb_id FROM ingest_archive WHERE tmdb_id IN ({placeholders})",
+                batch,
+            ).fetchall()
 
-        existing = {r["tmdb_id"] for r in existing_credits} | {r["tmdb_id"] for r in existing_queue}
+        existing = (
+            {r["tmdb_id"] for r in existing_credits}
+            | {r["tmdb_id"] for r in existing_queue}
+            | {r["tmdb_id"] for r in existing_archive}
+        )
         for mid in batch:
             if mid not in existing:
                 to_add.append(mid)
@@ -129,8 +155,9 @@ def ingest_changes(tmdb: TMDb, start_date: str, end_date: str, rate: RateLimiter
     added = 0
 
     while True:
-        rate.wait()
-        payload = tmdb.movie_changes(start_date=start_date, end_date=end_date, page=page)
+        record_rate_wait(rate.wait())
+        with METRICS.time("api_seconds", endpoint="changes"):
+            payload = tmdb.movie_changes(start_date=start_date, end_date=end_date, page=page)
         results = payload.get("results") or []
         if not results:
             break
@@ -149,22 +176,19 @@ def ingest_changes(tmdb: TMDb, start_date: str, end_date: str, rate: RateLimiter
 
 
 def next_queue_item(include_failed: bool, max_attempts: int) -> int | None:
-    statuses = ["pending"]
-    if include_failed:
-        statuses.append("failed")
-
-    placeholders = ",".join(["?"] * len(statuses))
+    # The statuses are literals so the planner can match idx_ingest_queue_claimable's WHERE.
+    only_pending = "" if include_failed else "AND status = 'pending'"
     with connect() as conn:
         row = conn.execute(
             f"""
             SELECT tmdb_id
             FROM ingest_queue
-            WHERE status IN ({placeholders})
+            WHERE status IN ('pending','failed') {only_pending}
               AND attempts < ?
             ORDER BY added_at
             LIMIT 1
             """,
-            statuses + [max_attempts],
+            (max_attempts,),
         ).fetchone()
     return int(row["tmdb_id"]) if row else None
 
@@ -183,6 +207,132 @@ def update_queue(tmdb_id: int, status: str, attempts: int | None = None, error:
             )
 
 
+def claim_queue_item(include_failed: bool, max_attempts: int) -> int | None:
+    tmdb_id = next_queue_item(include_failed=include_failed, max_attempts=max_attempts)
+    if tmdb_id is not None:
+        update_queue(tmdb_id, "in_progress")
+    return tmdb_id
+
+
+def mark_failed(tmdb_id: int, e: Exception):
+    with connect() as conn:
+        row = conn.execute(
+            "SELECT attempts FROM ingest_queue WHERE tmdb_id=?",
+            (tmdb_id,),
+        ).fetchone()
+    attempts = int(row["attempts"] or 0) + 1 if row else 1
+    update_queue(tmdb_id, "failed", attempts=attempts, error=str(e)[:500])
+
+
+def compact_queue(batch_size: int = 10_000) -> int:
+    """Move done rows from ingest_queue to ingest_archive; returns how many moved.
+
+    Failed rows stay queued whatever their attempts, so --include-failed can retry them
+    after an outage. Runs in batches so the worker and web app never wait long on the
+    write lock.
+    """
+    moved = 0
+    while True:
+        with connect() as conn:
+            ids = [r["tmdb_id"] for r in conn.execute("SELECT tmdb_id FROM ingest_queue WHERE status = 'done' LIMIT ?", (batch_size,))]
+            if not ids:
+                break
+            conn.executemany(
+                "INSERT OR REPLACE INTO ingest_archive (tmdb_id,archived_at) VALUES (?,?)",
+                [(mid, now_iso()) for mid in ids],
+            )
+            conn.executemany("DELETE FROM ingest_queue WHERE tmdb_id=?", [(mid,) for mid in ids])
+        moved += len(ids)
+    set_state("last_compaction", now_iso())
+    return moved
+
+
+def queue_depth() -> dict[str, int]:
+    with connect() as conn:
+        rows = conn.execute("SELECT status, COUNT(*) AS n FROM ingest_queue GROUP BY status").fetchall()
+    return {r["status"]: int(r["n"]) for r in rows}
+
+
+class CatalogBumps:
+    """Bumps the catalog generation after movies were written: at most every interval
+    during a run, and once when it ends.
+
+    Each bump rebuilds facet_cube and makes every web process with a snapshot
+    (catalog.py) rebuild it, so it is not done per item or per progress line.
+    """
+
+    def __init__(self, interval: float = BUMP_INTERVAL):
+        self.interval = interval
+        self.bumped_at = time.monotonic()
+        self.pending = False
+
+    def written(self) -> None:
+        self.pending = True
+        if time.monotonic() - self.bumped_at >= self.interval:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.pending:
+            bump_catalog_generation()
+            self.pending = False
+        self.bumped_at = time.monotonic()
+
+
+class WorkerStats:
+    """Periodic progress lines, Prometheus textfile and the summary shown by --mode stats."""
+
+    def __init__(self, interval: float = 30.0, metrics_file: str | None = None):
+        self.interval = interval
+        self.metrics_file = metrics_file
+        self.started = time.monotonic()
+        self.last_report = self.started
+        # METRICS lives for the whole process; report only what happened since this run started.
+        self.baseline = METRICS.counters_snapshot()
+
+    def item(self, result: str) -> None:
+        METRICS.inc("items_total", result=result)
+        now = time.monotonic()
+        if self.interval > 0 and now - self.last_report >= self.interval:
+            self.report()
+
+    def report(self, final: bool = False) -> None:
+        now = time.monotonic()
+        self.last_report = now
+        elapsed = max(now - self.started, 1e-9)
+        items = METRICS.counter("items_total", since=self.baseline, result="done") + METRICS.counter(
+            "items_total", since=self.baseline, result="failed"
+        )
+        rate = items / elapsed
+
+        depth = queue_depth()
+        METRICS.clear_gauges("queue_depth")
+        for status, n in depth.items():
+            METRICS.set("queue_depth", n, status=status)
+        METRICS.set("items_per_second", rate)
+
+        parts = [f"{int(items)} items in {elapsed:.0f}s ({rate:.2f}/s)"]
+        for label, name, labels in (
+            ("credits", "api_seconds", {"endpoint": "credits"}),
+            ("details", "api_seconds", {"endpoint": "details"}),
+            ("db", "db_write_seconds", {}),
+            ("poster", "poster_seconds", {}),
+        ):
+            h = METRICS.histogram(name, **labels)
+            if h and h.count:
+                parts.append(f"{label} p50 {h.quantile(0.5) * 1000:g}ms p95 {h.quantile(0.95) * 1000:g}ms")
+        parts.append(f"rate wait {METRICS.counter('rate_wait_seconds_total', since=self.baseline):.1f}s")
+        parts.append("queue " + " ".join(f"{k}={v}" for k, v in sorted(depth.items())))
+        print(("Worker done: " if final else "Worker: ") + ", ".join(parts))
+
+        if self.metrics_file:
+            METRICS.write_textfile(self.metrics_file)
+        summary = METRICS.summary(since=self.baseline)
+        summary["items_per_second"] = rate
+        summary["elapsed_seconds"] = elapsed
+        summary["updated_at"] = now_iso()
+        set_state("worker_stats", json.dumps(summary))
+
+
 def worker(
     tmdb: TMDb,
     rate: RateLimiter,
@@ -191,68 +341,283 @@ def worker(
     max_items: int,
     include_failed: bool,
     max_attempts: int,
+    stats: WorkerStats | None = None,
 ):
+    stats = stats or WorkerStats()
+    bumps = CatalogBumps()
     processed = 0
 
     while True:
         if max_items > 0 and processed >= max_items:
             break
 
-        tmdb_id = next_queue_item(include_failed=include_failed, max_attempts=max_attempts)
+        tmdb_id = claim_queue_item(include_failed=include_failed, max_attempts=max_attempts)
         if tmdb_id is None:
             break
 
-        update_queue(tmdb_id, "in_progress")
         try:
-            rate.wait()
-            hydrate_directors(tmdb, tmdb_id)
+            record_rate_wait(rate.wait())
+            with METRICS.time("api_seconds", endpoint="credits"):
+                credits = tmdb.movie_credits(tmdb_id)
+            with METRICS.time("db_write_seconds"):
+                save_directors(tmdb_id, credits)
 
             if is_women_directed(tmdb_id):
-                rate.wait()
-                hydrate_movie_details(tmdb, tmdb_id)
+                record_rate_wait(rate.wait())
+                with METRICS.time("api_seconds", endpoint="details"):
+                    details = tmdb.movie_details(tmdb_id)
+                with METRICS.time("db_write_seconds"):
+                    upsert_movie_details(details)
                 for size in poster_sizes:
-                    rate.wait()
+                    record_rate_wait(rate.wait())
+                    started = time.perf_counter()
                     downloaded = prefetch_poster(tmdb, tmdb_id, size=size)
+                    if downloaded:
+                        METRICS.observe("poster_seconds", time.perf_counter() - started)
                     if downloaded and poster_sleep > 0:
                         time.sleep(poster_sleep)
 
             update_queue(tmdb_id, "done")
+            bumps.written()
+            stats.item("done")
         except Exception as e:
-            with connect() as conn:
-                row = conn.execute(
-                    "SELECT attempts FROM ingest_queue WHERE tmdb_id=?",
-                    (tmdb_id,),
-                ).fetchone()
-            attempts = int(row["attempts"] or 0) + 1 if row else 1
-            update_queue(tmdb_id, "failed", attempts=attempts, error=str(e)[:500])
+            mark_failed(tmdb_id, e)
+            stats.item("failed")
 
         processed += 1
 
-    print(f"Worker processed {processed} items.")
+    bumps.flush()
+    stats.report(final=True)
 
 
-def run_weekly(tmdb: TMDb, rate: RateLimiter, poster_sizes: list[str], poster_sleep: float):
+async def process_item_async(tmdb: AsyncTMDb, rate: AsyncRateLimiter, tmdb_id: int, poster_sizes: list[str]):
+    record_rate_wait(await rate.wait())
+    with METRICS.time("api_seconds", endpoint="credits"):
+        credits = await tmdb.movie_credits(tmdb_id)
+    with METRICS.time("db_write_seconds"):
+        save_directors(tmdb_id, credits)
+
+    if not is_women_directed(tmdb_id):
+        return
+
+    record_rate_wait(await rate.wait())
+    with METRICS.time("api_seconds", endpoint="details"):
+        details = await tmdb.movie_details(tmdb_id)
+    with METRICS.time("db_write_seconds"):
+        upsert_movie_details(details)
+
+    poster_path = details.get("poster_path")
+    if not poster_path:
+        return
+
+    async def fetch(size: str):
+        cache_path = poster_cache_path(tmdb_id, size)
+        if cache_path.exists():
+            return
+        record_rate_wait(await rate.wait())
+        with METRICS.time("poster_seconds"):
+            await tmdb.download(tmdb.poster_url(poster_path, size=size), cache_path)
+
+    # Poster failures are not fatal, same as prefetch_poster.
+    await asyncio.gather(*(fetch(size) for size in poster_sizes), return_exceptions=True)
+
+
+async def worker_async(
+    tmdb: AsyncTMDb,
+    rate: AsyncRateLimiter,
+    poster_sizes: list[str],
+    max_items: int,
+    include_failed: bool,
+    max_attempts: int,
+    stats: WorkerStats | None = None,
+):
+    stats = stats or WorkerStats()
+    bumps = CatalogBumps()
+    claimed = 0
+
+    async def run_one():
+        nonlocal claimed
+        while True:
+            if max_items > 0 and claimed >= max_items:
+                return
+            # Claiming is synchronous, so tasks on this loop never claim the same row.
+            tmdb_id = claim_queue_item(include_failed=include_failed, max_attempts=max_attempts)
+            if tmdb_id is None:
+                return
+            claimed += 1
+
+            try:
+                await process_item_async(tmdb, rate, tmdb_id, poster_sizes)
+                update_queue(tmdb_id, "done")
+                bumps.written()
+                stats.item("done")
+            except Exception as e:
+                mark_failed(tmdb_id, e)
+                stats.item("failed")
+
+    await asyncio.gather(*(run_one() for _ in range(tmdb.concurrency)))
+    bumps.flush()
+    stats.report(final=True)
+
+
+def run_worker(
+    tmdb: TMDb,
+    rate: RateLimiter,
+    concurrency: int,
+    poster_sizes: list[str],
+    poster_sleep: float,
+    max_items: int,
+    include_failed: bool,
+    max_attempts: int,
+    stats: WorkerStats | None = None,
+):
+    if concurrency <= 1:
+        worker(
+            tmdb,
+            rate=rate,
+            poster_sizes=poster_sizes,
+            poster_sleep=poster_sleep,
+            max_items=max_items,
+            include_failed=include_failed,
+            max_attempts=max_attempts,
+            stats=stats,
+        )
+        return
+
+    async def run():
+        async with AsyncTMDb(
+            api_key=tmdb.api_key,
+            region=tmdb.region,
+            language=tmdb.language,
+            concurrency=concurrency,
+        ) as atmdb:
+            await worker_async(
+                atmdb,
+                rate=AsyncRateLimiter(rate.rate_per_sec),
+                poster_sizes=poster_sizes,
+                max_items=max_items,
+                include_failed=include_failed,
+                max_attempts=max_attempts,
+                stats=stats,
+            )
+
+    asyncio.run(run())
+
+
+def run_weekly(
+    tmdb: TMDb,
+    rate: RateLimiter,
+    poster_sizes: list[str],
+    poster_sleep: float,
+    concurrency: int = 1,
+    stats: WorkerStats | None = None,
+):
     today = date.today()
     start_date = (today - timedelta(days=7)).isoformat()
     end_date = today.isoformat()
 
     ingest_export(days_back=7)
     ingest_changes(tmdb, start_date=start_date, end_date=end_date, rate=rate)
-    worker(
+    run_worker(
         tmdb,
         rate=rate,
+        concurrency=concurrency,
         poster_sizes=poster_sizes,
         poster_sleep=poster_sleep,
         max_items=0,
         include_failed=True,
         max_attempts=5,
+        stats=stats,
+    )
+    print(f"Archived {compact_queue()} done queue rows.")
+    run_similar()
+
+
+def run_similar(full: bool = False):
+    try:
+        from similar import update_similar
+
+        result = update_similar(full=full)
+    except ImportError as e:
+        print(f"Skipping similar movies: {e}")
+        return
+    print(
+        f"Similar movies: scored {result['scored']} of {result['catalog']}, "
+        f"updated {result['merged']} existing lists in {result['seconds']:.1f}s"
+    )
+
+
+def run_warm_posters(pages: int, max_mb: float, max_requests: int, concurrency: int, rate: float):
+    from warming import warm_posters
+
+    result = warm_posters(
+        pages_per_sort=pages,
+        max_bytes=int(max_mb * 1024 * 1024),
+        max_requests=max_requests,
+        concurrency=concurrency,
+        rate_per_sec=rate,
+    )
+    print(
+        f"Warmed posters ({', '.join(result['sizes'])}) for {result['movies']} likely movies in {result['seconds']:.1f}s: "
+        f"{result['cached']} already cached, {result['requests']} of {result['missing']} missing fetched "
+        f"({result['bytes'] / 1024 / 1024:.1f} MB), {result['failed']} failed."
+    )
+
+
+def publish_if_enabled(keep: int = 3):
+    """Publish a new read snapshot after a run, once snapshots are in use (first one via --mode publish)."""
+    if published_path() is None:
+        return
+    print(f"Published {publish_snapshot(keep=keep)}")
+
+
+def print_stats():
+    depth = queue_depth()
+    print("Queue:")
+    for status in ("pending", "in_progress", "failed", "done"):
+        print(f"  {status:<12} {depth.pop(status, 0)}")
+    for status, n in sorted(depth.items()):
+        print(f"  {status:<12} {n}")
+    with connect() as conn:
+        archived = conn.execute("SELECT COUNT(*) FROM ingest_archive").fetchone()[0]
+    print(f"Archive:\n  {'done':<12} {archived}")
+
+    with connect() as conn:
+        rows = conn.execute("SELECT key, value FROM ingest_state WHERE key != 'worker_stats' ORDER BY key").fetchall()
+    print("State:")
+    for r in rows:
+        print(f"  {r['key']:<24} {r['value']}")
+
+    raw = get_state("worker_stats")
+    if not raw:
+        print("No worker run recorded yet.")
+        return
+    summary = json.loads(raw)
+    print(
+        f"Last worker run (updated {summary['updated_at']}): "
+        f"{summary['elapsed_seconds']:.0f}s, {summary['items_per_second']:.2f} items/s"
     )
+    for name, value in sorted(summary["counters"].items()):
+        print(f"  {name:<40} {value:g}")
+    for name, h in sorted(summary["histograms"].items()):
+        if not h["count"]:
+            continue
+        print(
+            f"  {name:<40} n={h['count']} mean={h['mean'] * 1000:.1f}ms "
+            f"p50<={h['p50'] * 1000:g}ms p95<={h['p95'] * 1000:g}ms"
+        )
 
 
 def main():
     parser = argparse.ArgumentParser(description="TMDb ingestion pipeline.")
-    parser.add_argument("--mode", choices=["export", "changes", "worker", "weekly"], default="weekly")
+    parser.add_argument("--mode", choices=["export", "changes", "worker", "weekly", "stats", "director-stats", "export-static", "similar", "publish", "rollback", "compact-queue", "warm-posters"], default="weekly")
     parser.add_argument("--rate", type=float, default=20.0, help="Max requests per second")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Concurrent worker requests over pooled async connections (1 = synchronous worker)",
+    )
     parser.add_argument("--poster-sizes", default="w342", help="Comma list of poster sizes to cache")
     parser.add_argument("--poster-sleep", type=float, default=0.05, help="Sleep after poster downloads (seconds)")
     parser.add_argument("--start-date", default=None, help="Changes start date (YYYY-MM-DD)")
@@ -262,15 +627,63 @@ def main():
     parser.add_argument("--max-attempts", type=int, default=5, help="Max attempts for failed items")
     parser.add_argument("--region", default=None, help="TMDb region override")
     parser.add_argument("--language", default=None, help="TMDb language override")
+    parser.add_argument("--stats-interval", type=float, default=30.0, help="Seconds between worker progress lines (0 = off)")
+    parser.add_argument("--metrics-file", default=None, help="Write Prometheus text metrics here (node_exporter textfile)")
+    parser.add_argument("--keep", type=int, default=3, help="Published snapshots to keep (--mode publish)")
+    parser.add_argument("--full", action="store_true", help="--mode similar: rescore every movie, not just new/changed ones")
+    parser.add_argument("--warm-pages", type=int, default=5, help="--mode warm-posters: browse pages per sort always warmed")
+    parser.add_argument("--warm-max-mb", type=float, default=200.0, help="--mode warm-posters: download budget in MB")
+    parser.add_argument("--warm-max-requests", type=int, default=2000, help="--mode warm-posters: download budget in requests")
+    parser.add_argument("--out", default="static_site", help="Output directory for --mode export-static")
+    parser.add_argument("--workers", type=int, default=None, help="Render processes for --mode export-static (default: CPUs)")
     args = parser.parse_args()
 
     init_db()
+
+    if args.mode == "stats":
+        print_stats()
+        return
+
+    if args.mode == "director-stats":
+        print(f"Rebuilt director_stats for {rebuild_director_stats()} directors.")
+        bump_catalog_generation()  # also rebuilds facet_cube
+        print("Rebuilt facet_cube.")
+        return
+
+    if args.mode == "similar":
+        run_similar(full=args.full)
+        return
+
+    if args.mode == "compact-queue":
+        print(f"Archived {compact_queue()} done queue rows.")
+        return
+
+    if args.mode == "publish":
+        print(f"Published {publish_snapshot(keep=args.keep)}")
+        return
+
+    if args.mode == "rollback":
+        print(f"Rolled back to {rollback_snapshot()}")
+        return
+
+    if args.mode == "export-static":
+        from static_export import export_static
+
+        result = export_static(args.out, workers=args.workers)
+        print(
+            f"Exported {result['pages']} pages to {args.out} in {result['seconds']:.1f}s: "
+            f"{result['written']} written, {result['unchanged']} unchanged, {result['failed']} failed, "
+            f"{result['assets_copied']} assets copied, {result['removed']} stale files removed."
+        )
+        return
+
     tmdb = TMDb(
         region=args.region or "US",
         language=args.language or "en-US",
     )
     rate = RateLimiter(args.rate)
     sizes = [s.strip() for s in args.poster_sizes.split(",") if s.strip()]
+    stats = WorkerStats(interval=args.stats_interval, metrics_file=args.metrics_file)
 
     if args.mode == "export":
         ingest_export(days_back=7)
@@ -284,19 +697,44 @@ def main():
         ingest_changes(tmdb, start_date=args.start_date, end_date=args.end_date, rate=rate)
         return
 
+    warm = dict(
+        pages=args.warm_pages,
+        max_mb=args.warm_max_mb,
+        max_requests=args.warm_max_requests,
+        concurrency=args.concurrency,
+        rate=args.rate,
+    )
+
+    if args.mode == "warm-posters":
+        run_warm_posters(**warm)
+        return
+
     if args.mode == "worker":
-        worker(
+        run_worker(
             tmdb,
             rate=rate,
+            concurrency=args.concurrency,
             poster_sizes=sizes,
             poster_sleep=args.poster_sleep,
             max_items=args.max_items,
             include_failed=args.include_failed,
             max_attempts=args.max_attempts,
+            stats=stats,
         )
+        publish_if_enabled(keep=args.keep)
         return
 
-    run_weekly(tmdb, rate=rate, poster_sizes=sizes, poster_sleep=args.poster_sleep)
+    run_weekly(
+        tmdb,
+        rate=rate,
+        poster_sizes=sizes,
+        poster_sleep=args.poster_sleep,
+        concurrency=args.concurrency,
+        stats=stats,
+    )
+    publish_if_enabled(keep=args.keep)
+    # After publishing, so the warmer plans from the catalog the web app now serves.
+    run_warm_posters(**warm)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,197 @@
+"""Poster cache warming driven by what visitors actually request.
+
+The web app counts unfiltered browse pages (sort, page), share views and poster
+sizes in memory; a background thread adds them to access_stats every
+FLUSH_INTERVAL seconds, so requests never wait on a write. `--mode warm-posters` (also run
+after the weekly ingest) ranks the movies whose posters are likely to be asked
+for next: the first pages of every sort, each visited page and the page after
+it weighted by visits, and the items of popular shares plus their "more like
+this" neighbours. Missing posters are downloaded over pooled connections until
+the byte or request budget is used up. Counts are halved after each run so old
+traffic fades.
+
+    python tmdb_ingest.py --mode warm-posters --warm-pages 5 --warm-max-mb 200
+"""
+import asyncio
+import atexit
+import math
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from db import connect, connect_catalog
+from tmdb import now_iso
+
+FLUSH_INTERVAL = 60.0  # seconds between access_stats writes from the web app
+BROWSE_PAGE_SIZE = 20  # app.browse()
+DEFAULT_SIZE = "w342"  # browse and share cards
+
+
+class AccessLog:
+    """In-memory hit counts, added to access_stats every interval by a background thread."""
+
+    def __init__(self, interval: float = FLUSH_INTERVAL):
+        self.interval = interval
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def record(self, kind: str, key: str) -> None:
+        with self._lock:
+            self._counts[(kind, key)] += 1
+            if self._thread is None:
+                # Started on first use, so processes that never record (exports, tools) have no thread.
+                self._thread = threading.Thread(target=self._run, name="access-log", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush_pending)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            self.flush_pending()
+
+    def flush_pending(self) -> None:
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+        if counts:
+            self.flush(counts)
+
+    def flush(self, counts: Counter) -> None:
+        try:
+            with connect() as conn:
+                conn.executemany(
+                    """
+                    INSERT INTO access_stats (kind, key, hits, last_seen) VALUES (?,?,?,?)
+                    ON CONFLICT(kind, key) DO UPDATE SET hits = hits + excluded.hits, last_seen = excluded.last_seen
+                    """,
+                    [(kind, key, n, now_iso()) for (kind, key), n in counts.items()],
+                )
+        except sqlite3.Error:
+            # Busy database: keep the counts for the next flush rather than losing them.
+            with self._lock:
+                self._counts.update(counts)
+
+
+def access_counts(kind: str) -> dict[str, int]:
+    with connect() as conn:
+        rows = conn.execute("SELECT key, hits FROM access_stats WHERE kind = ? AND hits > 0", (kind,)).fetchall()
+    return {r["key"]: r["hits"] for r in rows}
+
+
+def decay_access_stats() -> None:
+    with connect() as conn:
+        conn.execute("UPDATE access_stats SET hits = hits / 2")
+        conn.execute("DELETE FROM access_stats WHERE hits = 0")
+
+
+def ranked_pages(pages_per_sort: int, last_page: int) -> list[tuple[str, int]]:
+    """(sort, page) most likely to be requested first: visits to the page and to the one before it.
+
+    Pages outside 1..last_page (the catalog shrank, or counts from older versions) are ignored.
+    """
+    from catalog import SORT_COLUMNS
+
+    visits: dict[tuple[str, int], int] = {}
+    for key, hits in access_counts("browse").items():
+        sort, _, page = key.partition(":")
+        if sort in SORT_COLUMNS and page.isdigit() and 1 <= int(page) <= last_page:
+            visits[(sort, int(page))] = hits
+
+    candidates = {(sort, page) for sort in SORT_COLUMNS for page in range(1, pages_per_sort + 1)}
+    candidates |= set(visits) | {(sort, page + 1) for sort, page in visits}
+    candidates = {(sort, page) for sort, page in candidates if page <= last_page}
+    score = {c: visits.get(c, 0) + visits.get((c[0], c[1] - 1), 0) for c in candidates}
+    return sorted(candidates, key=lambda c: (-score[c], c[1], c[0]))
+
+
+def share_movies(shares: int, neighbours: int) -> list[int]:
+    """Items of the most viewed shares, each followed by its top similar movies."""
+    tokens = sorted(access_counts("share").items(), key=lambda kv: -kv[1])[:shares]
+    out = []
+    with connect() as conn:
+        for token, _ in tokens:
+            out += [r["tmdb_id"] for r in conn.execute("SELECT tmdb_id FROM shared_set_items WHERE token=? ORDER BY tmdb_id", (token,))]
+    with connect_catalog() as conn:
+        for tmdb_id in list(out):
+            out += [
+                r["similar_id"]
+                for r in conn.execute(
+                    "SELECT similar_id FROM similar_movies WHERE tmdb_id=? ORDER BY rank LIMIT ?", (tmdb_id, neighbours)
+                )
+            ]
+    return out
+
+
+def plan(pages_per_sort: int = 5, shares: int = 20, neighbours: int = 4) -> list[int]:
+    """Movie ids in warming order, without duplicates."""
+    from store import browse_movies
+
+    total, _ = browse_movies(limit=1)
+    ordered: dict[int, None] = {}
+    for sort, page in ranked_pages(pages_per_sort, math.ceil(total / BROWSE_PAGE_SIZE)):
+        _, rows = browse_movies(sort=sort, offset=(page - 1) * BROWSE_PAGE_SIZE, limit=BROWSE_PAGE_SIZE)
+        ordered.update((r["tmdb_id"], None) for r in rows)
+    ordered.update((tmdb_id, None) for tmdb_id in share_movies(shares, neighbours))
+    return list(ordered)
+
+
+def poster_sizes() -> list[str]:
+    sizes = sorted(access_counts("poster_size").items(), key=lambda kv: (-kv[1], kv[0] != DEFAULT_SIZE))
+    return [size for size, _ in sizes] or [DEFAULT_SIZE]
+
+
+async def _download(jobs, concurrency: int, rate_per_sec: float, max_bytes: int, max_requests: int) -> dict:
+    from tmdb_async import AsyncRateLimiter, AsyncTMDb
+
+    totals = {"requests": 0, "bytes": 0, "failed": 0}
+    rate = AsyncRateLimiter(rate_per_sec)
+    jobs = iter(jobs)
+    async with AsyncTMDb(concurrency=concurrency) as tmdb:
+
+        async def run_one():
+            # Tasks share one iterator; budgets are checked before each download, so the
+            # byte budget can be overshot by at most `concurrency` posters.
+            for cache_path, poster_path, size in jobs:
+                if totals["requests"] >= max_requests or totals["bytes"] >= max_bytes:
+                    return
+                totals["requests"] += 1
+                await rate.wait()
+                try:
+                    totals["bytes"] += await tmdb.download(tmdb.poster_url(poster_path, size=size), cache_path)
+                except Exception:
+                    totals["failed"] += 1
+
+        await asyncio.gather(*(run_one() for _ in range(tmdb.concurrency)))
+    return totals
+
+
+def warm_posters(
+    pages_per_sort: int = 5,
+    max_bytes: int = 200 * 1024 * 1024,
+    max_requests: int = 2000,
+    concurrency: int = 4,
+    rate_per_sec: float = 20.0,
+) -> dict:
+    """Download missing posters for the planned movies within the budgets; returns counts."""
+    from store import fetch_movies_for_ids, poster_cache_path
+
+    started = time.perf_counter()
+    ids = plan(pages_per_sort)
+    sizes = poster_sizes()
+    jobs, cached = [], 0
+    for m in fetch_movies_for_ids(ids):
+        if not m["poster_path"]:
+            continue
+        for size in sizes:
+            cache_path = poster_cache_path(m["tmdb_id"], size)
+            if cache_path.exists():
+                cached += 1
+            else:
+                jobs.append((cache_path, m["poster_path"], size))
+
+    result = {"movies": len(ids), "sizes": sizes, "cached": cached, "missing": len(jobs)}
+    result.update(asyncio.run(_download(jobs, concurrency, rate_per_sec, max_bytes, max_requests)))
+    decay_access_stats()
+    result["seconds"] = time.perf_counter() - started
+    return result